@@ -1,4 +1,4 @@
-import os, traceback, pytz, pandas as pd, streamlit as st
+import os, traceback, pytz, streamlit as st
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -23,11 +23,10 @@ except Exception as e:
 
 try:
     from workflows import onboarding, offboarding, preprocess_llm, db_refresh, office_ops_llm
-    from tools import db_tools
+    from tools import db_tools, schema_catalog
 except Exception:
     onboarding = offboarding = preprocess_llm = db_refresh = office_ops_llm = None
-    from types import SimpleNamespace
-    db_tools = SimpleNamespace(PG_CONN=None)
+    db_tools = schema_catalog = None
 
 try:
     from modules.pr_reviewer import PRReviewer
@@ -56,8 +55,8 @@ def load_google_credentials(pkl_path="user_creds.pkl"):
 
 if "page" not in st.session_state:
     st.session_state.page = "home"
-if "refresh_table" not in st.session_state:
-    st.session_state.refresh_table = None
+if "refresh_job" not in st.session_state:
+    st.session_state.refresh_job = None
 
 def intro_page():
     st.set_page_config(page_title="Bella • Office Assistant", layout="centered")
@@ -256,15 +255,19 @@ def run_nlp_flow(nl, user_id):
         preprocess_llm.run_nlp(nl, st.write)
     elif "refresh" in nl.lower():
         st.info("Enter a table name to refresh, or leave blank to refresh the whole DB.")
-        if st.session_state.refresh_table is None:
+        if st.session_state.refresh_job is None and db_refresh:
             with st.form("refresh_form"):
                 tbl = st.text_input("Table name (optional)")
                 if st.form_submit_button("Start refresh"):
-                    st.session_state.refresh_table = tbl or None
-        if st.session_state.refresh_table is not None and db_refresh:
-            db_refresh.run(st.write, st.session_state.refresh_table)
+                    try:
+                        st.session_state.refresh_job = db_refresh.start_refresh(tbl.strip() or None)
+                    except ValueError as e:
+                        st.error(str(e))
+        if st.session_state.refresh_job is not None and db_refresh:
             if st.button("Clear refresh state"):
-                st.session_state.refresh_table = None
+                st.session_state.refresh_job = None
+                st.experimental_rerun()
+            db_refresh.render(st.session_state.refresh_job, st.write)
     elif "office summary" in nl.lower() or "eod report" in nl.lower():
         if office_ops_llm and st.button("Run End-of-Day Office Summary"):
             office_ops_llm.run_daily_summary(logger=st.write)
@@ -304,18 +307,9 @@ def main_page():
             link = event.get("htmlLink")
             when = datetime.fromisoformat(event["start"]["dateTime"]).astimezone(IST).strftime("%a %b %d • %I:%M %p")
             st.success(f"Meeting booked for **{when} IST**  [Open]({link})")
-    if db_tools.PG_CONN:
+    if schema_catalog:
         try:
-            ddl = pd.read_sql(
-                """
-                SELECT table_schema||'.'||table_name AS tbl,
-                       string_agg(column_name||' '||data_type, ', ') AS cols
-                FROM information_schema.columns
-                GROUP BY 1
-                LIMIT 20
-                """,
-                db_tools.PG_CONN,
-            ).to_string(index=False)
+            ddl = schema_catalog.catalog_text(limit=20)
             st.expander("Database DDL snapshot (top 20 tables)").write(ddl)
         except Exception:
             pass
@@ -0,0 +1,90 @@
+# dag.py
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def run_dag(steps: dict, max_workers: int = 4, log=print):
+    """
+    Run a small dependency graph of blocking steps on a thread pool.
+
+    steps → {name: (fn, [dependency names])} or (fn, deps, describe); each fn
+    is called with its dependencies' results as positional args, in the order
+    listed. `describe(result)` returns the line logged when the step succeeds.
+    Independent steps run concurrently, at most max_workers at a time. A failed
+    step skips everything downstream of it, but unrelated branches still run
+    to completion. Progress is logged from the calling thread, so `log` can be
+    st.write; the last line is the wall time and the critical path.
+
+    Returns (results, timings, errors), keyed by step name; timings are seconds.
+    """
+    steps = {name: (spec[0], spec[1], spec[2] if len(spec) > 2 else None) for name, spec in steps.items()}
+    for name, (_, deps, _) in steps.items():
+        unknown = [d for d in deps if d not in steps]
+        if unknown:
+            raise ValueError(f"Step {name!r} depends on unknown step(s): {unknown}")
+
+    results, timings, errors = {}, {}, {}
+    pending = dict(steps)
+    started = time.perf_counter()
+    running = {}
+
+    def timed(name, fn, args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            progressed = False
+            for name, (fn, deps, _) in list(pending.items()):
+                failed = [d for d in deps if d in errors]
+                if failed:
+                    errors[name] = RuntimeError(f"skipped: upstream {', '.join(failed)} failed")
+                    log(f"⏭️ {name} skipped ({', '.join(failed)} failed)")
+                elif all(d in results for d in deps):
+                    log(f"▶️ {name} started")
+                    running[pool.submit(timed, name, fn, [results[d] for d in deps])] = name
+                else:
+                    continue
+                del pending[name]
+                progressed = True
+
+            if not running:
+                if progressed:
+                    continue
+                raise ValueError(f"Dependency cycle among steps: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                try:
+                    results[name] = fut.result()
+                    describe = steps[name][2]
+                    log(f"{describe(results[name]) if describe else f'✅ {name} done'} in {timings[name]:.2f}s")
+                except Exception as e:
+                    errors[name] = e
+                    log(f"❌ {name} failed after {timings[name]:.2f}s: {e}")
+
+    seconds, path = critical_path(steps, timings)
+    log(f"⏱️ {time.perf_counter() - started:.2f}s wall; critical path {' → '.join(path)} ({seconds:.2f}s)")
+    return results, timings, errors
+
+
+def critical_path(steps: dict, timings: dict) -> tuple[float, list[str]]:
+    """
+    Longest chain of dependent steps by measured time — the lower bound on
+    the run's wall time however many workers there are. Steps that never
+    ran count as zero. Returns (seconds, [step names in order]).
+    """
+    finish: dict[str, tuple[float, list[str]]] = {}
+
+    def visit(name):
+        if name not in finish:
+            before = max((visit(d) for d in steps[name][1]), default=(0.0, []))
+            ran = [name] if name in timings else []
+            finish[name] = (before[0] + timings.get(name, 0.0), before[1] + ran)
+        return finish[name]
+
+    return max((visit(n) for n in steps), default=(0.0, []))
@@ -45,9 +45,20 @@ from slack_handlers.tickets import (
     handle_ticket_interaction,
     handle_resolve_command
 )
+from ticket_metrics import get_ticket_rollups
+from db import engine
+from sqlalchemy import inspect, text
+from datetime import date
+from models import Base
 
 
 app = FastAPI()
+Base.metadata.create_all(bind=engine)  # creates any new tables, leaves existing ones alone
+# …and columns added to tables that already existed
+for table, column, ddl in (("ticket_assignments", "notified_at", "DATETIME"), ("refresh_jobs", "diff", "TEXT")):
+    if column not in {c["name"] for c in inspect(engine).get_columns(table)}:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
 start_cron_jobs()
 
 async def ticket_background(details: dict, response_url: str):
@@ -61,13 +72,18 @@ async def ticket_background(details: dict, response_url: str):
 
 
 async def background_send_report(response_url: str):
-    # 1) Do the heavy work
-    csv_path, pdf_path = compile_and_send_weekly_report()
+    # 1) Do the heavy work off the event loop
+    try:
+        csv_path, pdf_path = await asyncio.to_thread(compile_and_send_weekly_report)
+        text = f"✅ Your report is ready: `{csv_path}`, `{pdf_path}`"
+    except Exception as e:
+        # finished stages are cached, so running /getreport again only retries what failed
+        text = f"⚠️ Report incomplete: {e}. Run /getreport again to retry."
 
     # 2) Notify Slack that it’s done
     payload = {
         "response_type": "ephemeral",
-        "text": f"✅ Your report is ready: `{csv_path}`, `{pdf_path}`"
+        "text": text
     }
 
     async with httpx.AsyncClient() as client:
@@ -196,6 +212,11 @@ def google_callback(request: Request):
     code=request.query_params.get("code")
     return JSONResponse(content=handle_google_callback(code))
 
+@app.get("/metrics/tickets")
+def ticket_metrics(engineer: str | None = None, day: date | None = None):
+    # served from the precomputed rollups only
+    return {"rollups": get_ticket_rollups(engineer_id=engineer, day=day)}
+
 @app.post("/slack/events")
 async def events(request: Request):
     body = await request.json()
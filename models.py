@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float, Text, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -24,4 +24,48 @@ class TicketAssignment(Base):
     ticket_id    = Column(String, unique=True, index=True)
     engineer_id  = Column(String, index=True)
     assigned_at  = Column(DateTime, default=datetime.utcnow)
-    resolved_at  = Column(DateTime, nullable=True)
\ No newline at end of file
+    resolved_at  = Column(DateTime, nullable=True)
+    notified_at  = Column(DateTime, nullable=True)    # set once the engineer's DM went out
+
+class TicketEvent(Base):
+    """Append-only log of ticket lifecycle events (assigned/accepted/escalated/resolved)."""
+    __tablename__ = "ticket_events"
+    id          = Column(Integer, primary_key=True, index=True)
+    ticket_id   = Column(String, index=True)
+    engineer_id = Column(String, index=True)
+    event       = Column(String)
+    ts          = Column(DateTime, default=datetime.utcnow)
+
+class TicketLatencyRollup(Base):
+    """Per-engineer, per-day latency histogram with precomputed percentiles (seconds)."""
+    __tablename__ = "ticket_latency_rollups"
+    __table_args__ = (UniqueConstraint("engineer_id", "day", "metric"),)
+    id          = Column(Integer, primary_key=True, index=True)
+    engineer_id = Column(String, index=True)
+    day         = Column(Date, index=True)
+    metric      = Column(String)      # "first_response" | "resolution"
+    count       = Column(Integer, default=0)
+    buckets     = Column(Text, default="{}")
+    p50         = Column(Float)
+    p90         = Column(Float)
+    p99         = Column(Float)
+
+
+class RefreshJob(Base):
+    """One staging DB refresh: snapshotted → approved → wiped → restored → audited (or failed/cancelled)."""
+    __tablename__ = "refresh_jobs"
+    id            = Column(Integer, primary_key=True, index=True)
+    table_name    = Column(String, nullable=True)     # None → whole database; "a,b" → only those tables
+    status        = Column(String, index=True, default="pending")
+    running       = Column(String, nullable=True)     # stage a worker has claimed
+    requested_by  = Column(String)
+    approved_by   = Column(String, nullable=True)
+    snapshot_path = Column(String, nullable=True)
+    checksum      = Column(String, nullable=True)
+    method        = Column(String, nullable=True)
+    timings       = Column(Text, default="{}")        # stage → seconds
+    log           = Column(Text, default="[]")        # progress lines shown in the UI
+    diff          = Column(Text, nullable=True)       # db_admin.diff_live result vs the seed
+    error         = Column(Text, nullable=True)
+    created_at    = Column(DateTime, default=datetime.utcnow)
+    updated_at    = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
@@ -1,13 +1,22 @@
 import os
+import re
 import json
+import threading
 import openai
-from tools.db_tools import get_table_catalog
+from collections import OrderedDict
+from tools import schema_catalog
 
 # 1) Load your OpenAI key
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# 2) Pre-fetch a lightweight schema catalog for the LLM
-CATALOG = get_table_catalog(limit=200)
+# 2) The schema catalog is fetched lazily and cached (tools/schema_catalog.py),
+#    so importing this module never needs a live DB
+
+# Plans for repeated requests are reused instead of asking the LLM again.
+# Keys include the schema fingerprint, so any DDL change invalidates them.
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", 256))
+_plan_cache: OrderedDict = OrderedDict()
+_plan_cache_lock = threading.Lock()
 
 # 3) System prompt describing the JSON format
 SYSTEM_PROMPT = """
@@ -22,11 +31,26 @@ output exactly one JSON object with these keys:
 Use only read-only SQL (SELECT/COPY). Any other verb must set "dangerous": true.
 """
 
+def normalize_request(text: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation, so trivially different phrasings share a plan."""
+    return re.sub(r"\s+", " ", text.lower()).strip().rstrip(".!?")
+
 def plan(request_text: str) -> dict:
-    """Generate a tool plan given a natural-language request."""
+    """Generate a tool plan given a natural-language request (cached per normalized request)."""
+    key = (normalize_request(request_text), schema_catalog.get_catalog()["fingerprint"])
+    with _plan_cache_lock:
+        hit = _plan_cache.get(key)
+        if hit is not None:
+            _plan_cache.move_to_end(key)
+            return dict(hit)
+
+    # only the tables relevant to this request (plus FK neighbours) go in the
+    # prompt; fall back to the whole catalog if nothing matches
+    tables = schema_catalog.relevant_tables(request_text)
+    catalog = schema_catalog.catalog_text(limit=200, tables=tables)
     messages = [
         {"role": "system",  "content": SYSTEM_PROMPT},
-        {"role": "user",    "content": f"CATALOG:\n{CATALOG}\n\nREQUEST:\n{request_text}"},
+        {"role": "user",    "content": f"CATALOG:\n{catalog}\n\nREQUEST:\n{request_text}"},
     ]
 
     resp = openai.chat.completions.create(
@@ -36,4 +60,11 @@ def plan(request_text: str) -> dict:
         response_format={"type": "json_object"}  # force pure JSON response
     )
 
-    return json.loads(resp.choices[0].message.content)
+    decision = json.loads(resp.choices[0].message.content)
+    if not decision.get("ask"):
+        # follow-up questions depend on the conversation, so only final plans are cached
+        with _plan_cache_lock:
+            _plan_cache[key] = decision
+            while len(_plan_cache) > PLAN_CACHE_SIZE:
+                _plan_cache.popitem(last=False)
+    return dict(decision)
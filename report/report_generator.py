@@ -1,8 +1,13 @@
 # report/report_generator.py
 
 import os
+import csv
+import json
+import hashlib
 import smtplib
+import tempfile
 from datetime import datetime
+from pathlib import Path
 from email.message import EmailMessage
 
 import pandas as pd
@@ -12,7 +17,9 @@ from jira.jira_api import fetch_user_tasks
 from ai_utils import draft_weekly_report
 from smtp_utils import send_email_via_smtp
 from slack_utils.client import slack_client
+from dag import run_dag
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from db import SessionLocal
 from models import LogEntry
@@ -26,90 +33,194 @@ SLACK_TO_JIRA = {
 }
 
 
+# Rendered reports are cached here as weekly_report_<week>_<data version>.*
+REPORT_DIR = Path(os.getenv("REPORT_DIR", Path(tempfile.gettempdir()) / "bella_reports"))
+CSV_COLUMNS = ["user_name", "user_email", "total_minutes", "frequency"]
+
+
+def _report_version(db: Session) -> str:
+    """
+    Fingerprint of exactly what the report shows: a hash of the per-user
+    (user_id, minutes, count) aggregate, so any add, delete or edit that
+    changes the report — including reassigning a row to another user —
+    gives a new version, and edits that don't change it keep the cache.
+    """
+    h = hashlib.sha1()
+    q = (
+        db.query(LogEntry.user_id, func.sum(LogEntry.minutes), func.count(LogEntry.id))
+          .group_by(LogEntry.user_id)
+          .order_by(LogEntry.user_id)
+    )
+    for row in q:
+        h.update(repr(tuple(row)).encode())
+    return h.hexdigest()[:16]
+
+def iter_weekly_rows(db: Session):
+    """
+    Yield one summary dict per user, aggregated in SQL and streamed
+    off the cursor instead of loading every LogEntry.
+    """
+    q = (
+        db.query(
+            LogEntry.user_id,
+            func.sum(LogEntry.minutes),
+            func.count(LogEntry.id),
+        )
+        .group_by(LogEntry.user_id)
+        .order_by(LogEntry.user_id)
+        .yield_per(500)
+    )
+    for user_id, total, freq in q:
+        yield {
+            "user_name":     USER_ID_TO_NAME.get(user_id, user_id),
+            "user_email":    USER_ID_TO_EMAIL.get(user_id),
+            "total_minutes": total or 0,
+            "frequency":     freq,
+        }
+
 def compile_weekly_data():
     """
     Returns a DataFrame grouped by user_name & user_email,
     with total_minutes and frequency of logs.
     """
     db = SessionLocal()
-    entries = db.query(LogEntry).all()
-    db.close()
-
-    rows = []
-    for e in entries:
-        # if you used static map:
-        name  = USER_ID_TO_NAME.get(e.user_id, e.user_id)
-        email = USER_ID_TO_EMAIL.get(e.user_id)
-        # if you used dynamic lookup instead:
-        # profile = get_user_profile(e.user_id)
-        # name, email = profile['name'], profile['email']
-
-        rows.append({
-            "user_name":   name,
-            "user_email":  email,
-            "issue":       e.issue,
-            "minutes":     e.minutes,
-            "timestamp":   e.timestamp,
-        })
-
-    df = pd.DataFrame(rows)
-    summary = (
-        df.groupby(["user_name", "user_email"])
-          .agg(
-            total_minutes=("minutes","sum"),
-            frequency=("minutes","count")
-          )
-          .reset_index()
-    )
-    return summary
-
-def compile_and_send_weekly_report():
-    # 1) Gather data
-    df = compile_weekly_data()
-    csv_path = "weekly_report.csv"
-    pdf_path = "weekly_report.pdf"
-
-    # 2) Write CSV
-    df.to_csv(csv_path, index=False)
-
-    # 3) Generate PDF
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 10, f"Weekly Report - {datetime.utcnow().date()}", ln=1)
-
-    # Now iterate over your summary DataFrame
-    for _, row in df.iterrows():
-        user = row["user_name"]
-        mins = row["total_minutes"]
-        freq = row["frequency"]
-        pdf.cell(
-            0, 8,
-            f"{user}: {mins}h logged over {freq} entries",
-            ln=1
-        )
-
-    pdf.output(pdf_path)
+    try:
+        return pd.DataFrame(list(iter_weekly_rows(db)), columns=CSV_COLUMNS)
+    finally:
+        db.close()
+
+def _report_stub(db: Session) -> Path:
+    week = datetime.utcnow().strftime("%G-W%V")
+    return REPORT_DIR / f"weekly_report_{week}_{_report_version(db)}"
+
+def _load_state(stub: Path) -> dict:
+    try:
+        with open(f"{stub}.state.json") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_state(stub: Path, state: dict):
+    fd, tmp = tempfile.mkstemp(dir=REPORT_DIR, suffix=".state.part")
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, f"{stub}.state.json")
+
+def render_weekly_report(stub: Path | None = None) -> tuple[str, str]:
+    """
+    Write the CSV and PDF in a single pass over the DB cursor.
+    Each run writes to its own temp files and atomically renames them into
+    place, so concurrent calls never clobber each other; a report that already
+    exists for this (week, data version) is returned without touching the data.
+    """
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
 
-    # 4) Draft human summary
-    summary_text = draft_weekly_report(df)
+    db = SessionLocal()
+    try:
+        stub = stub or _report_stub(db)
+        csv_path, pdf_path = f"{stub}.csv", f"{stub}.pdf"
+        if os.path.exists(csv_path) and os.path.exists(pdf_path):
+            return csv_path, pdf_path
+
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_font("Arial", size=12)
+        pdf.cell(0, 10, f"Weekly Report - {datetime.utcnow().date()}", ln=1)
+
+        with tempfile.NamedTemporaryFile(
+            "w", newline="", dir=REPORT_DIR, suffix=".csv.part", delete=False
+        ) as f:
+            tmp_csv = f.name
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            for row in iter_weekly_rows(db):
+                writer.writerow(row)
+                pdf.cell(
+                    0, 8,
+                    f"{row['user_name']}: {row['total_minutes']}h logged over {row['frequency']} entries",
+                    ln=1
+                )
+    finally:
+        db.close()
+
+    fd, tmp_pdf = tempfile.mkstemp(dir=REPORT_DIR, suffix=".pdf.part")
+    os.close(fd)
+    pdf.output(tmp_pdf)
+
+    os.replace(tmp_csv, csv_path)
+    os.replace(tmp_pdf, pdf_path)
+    return csv_path, pdf_path
+
+def compile_and_send_weekly_report(log=print):
+    """
+    Runs the weekly report as a small DAG:
 
-    # 5) Email to manager
-    subject = f"Weekly Report — {datetime.utcnow().date()}"
-    send_email_via_smtp(
-        subject=subject,
-        body=summary_text,
-        to_addresses=[os.getenv("MANAGER_EMAIL")],
-        attachments=[csv_path, pdf_path]
-    )
+        render (CSV + PDF) ─┬─► email
+        draft (LLM)  ───────┴─► Slack
 
-    # 6) Optional: post back to Slack
-    mgr_channel = os.getenv("MANAGER_SLACK_CHANNEL")
-    if mgr_channel:
+    Independent stages run concurrently and their timings are recorded.
+    The draft is remembered per (week, data version). Finished deliveries
+    are remembered only while the run has failures, so a retry after e.g. a
+    failed Slack post redoes only that post, but once a run succeeds the
+    next one (cron, or another /getreport) delivers again.
+    """
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    db = SessionLocal()
+    try:
+        stub = _report_stub(db)
+    finally:
+        db.close()
+    state = _load_state(stub)
+
+    def draft():
+        # the summary is one row per user, so this is cheap next to the LLM call
+        return state.get("summary") or draft_weekly_report(compile_weekly_data())
+
+    def email(paths, summary_text):
+        if state.get("email_sent"):
+            return True
+        # MANAGER_EMAIL may be a comma-separated list
+        send_email_via_smtp(
+            subject=f"Weekly Report — {datetime.utcnow().date()}",
+            body=summary_text,
+            to_addresses=[a.strip() for a in os.getenv("MANAGER_EMAIL", "").split(",")],
+            attachments=list(paths)
+        )
+        return True
+
+    def slack(paths, summary_text):
+        mgr_channel = os.getenv("MANAGER_SLACK_CHANNEL")
+        if not mgr_channel:
+            return False
+        if state.get("slack_posted"):
+            return True
         slack_client.chat_postMessage(
             channel=mgr_channel,
             text=summary_text,
-            attachments=[{"title":"Weekly CSV","title_link":csv_path}]
+            attachments=[{"title":"Weekly CSV","title_link":paths[0]}]
         )
-
-    return csv_path, pdf_path
\ No newline at end of file
+        return True
+
+    results, timings, errors = run_dag({
+        "render": (lambda: render_weekly_report(stub), []),
+        "draft":  (draft,  []),
+        "email":  (email,  ["render", "draft"]),
+        "slack":  (slack,  ["render", "draft"]),
+    }, log=log)
+
+    if "draft" in results:
+        state["summary"] = results["draft"]
+    if errors:
+        state["email_sent"]   = bool(state.get("email_sent") or results.get("email"))
+        state["slack_posted"] = bool(state.get("slack_posted") or results.get("slack"))
+    else:
+        state.pop("email_sent", None)
+        state.pop("slack_posted", None)
+    state["timings"]      = {k: round(v, 3) for k, v in timings.items()}
+    _save_state(stub, state)
+
+    if errors:
+        raise RuntimeError(
+            "Weekly report failed at: " + ", ".join(f"{k} ({v})" for k, v in errors.items())
+        )
+    return results["render"]
\ No newline at end of file
@@ -42,7 +42,7 @@ async def handle_logtask_command(text: str, user_id: str):
     }, status_code=200)
 
 async def handle_sendreport_command():
-    csv_path,pdf_path = compile_and_send_weekly_report()
+    csv_path,pdf_path = await asyncio.to_thread(compile_and_send_weekly_report)
     return JSONResponse({"response_type":"ephemeral",
                          "text":f"✅ Report sent! `{csv_path}`, `{pdf_path}`"})
 
@@ -6,13 +6,77 @@ from fastapi.responses import JSONResponse
 from db import SessionLocal
 from models import TicketAssignment
 from oncall import find_available_engineer
+from ticket_metrics import record_event
 from ticket_api import assign_ticket, add_internal_note, resolve_ticket
 from slack_utils.client import slack_client
 from slack_sdk.errors import SlackApiError
 
 import httpx
 from typing import Optional
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+def _open_assignment(tid: str) -> Optional[tuple]:
+    """
+    Return (engineer, notified_at) for the open assignment of `tid`, or None
+    if the ticket is new (or was resolved and is being reopened).
+    """
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(TicketAssignment.engineer_id, TicketAssignment.notified_at)
+              .filter_by(ticket_id=tid, resolved_at=None)
+              .first()
+        )
+    finally:
+        db.close()
+    return tuple(row) if row else None
+
+
+def _mark_notified(tid: str):
+    db = SessionLocal()
+    try:
+        db.query(TicketAssignment).filter_by(ticket_id=tid, resolved_at=None) \
+          .update({"notified_at": datetime.utcnow()})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _upsert_assignment(tid: str, engineer: str) -> Optional[str]:
+    """
+    Record the assignment in one INSERT ... ON CONFLICT(ticket_id) statement.
+    A resolved row is reopened for the new engineer; an open row is left
+    untouched and None is returned, so a racing duplicate delivery loses.
+    """
+    now = datetime.utcnow()
+    stmt = sqlite_insert(TicketAssignment).values(
+        ticket_id=tid, engineer_id=engineer, assigned_at=now, resolved_at=None, notified_at=None
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TicketAssignment.ticket_id],
+        set_={"engineer_id": engineer, "assigned_at": now, "resolved_at": None, "notified_at": None},
+        where=TicketAssignment.resolved_at.is_not(None),
+    ).returning(TicketAssignment.engineer_id)
+
+    db = SessionLocal()
+    try:
+        row = db.execute(stmt).first()
+        db.commit()
+    finally:
+        db.close()
+    return row[0] if row else None
+
+
+def _reassign(tid: str, engineer: str):
+    """Point the open assignment at `engineer`, so resolving it later finds the row."""
+    db = SessionLocal()
+    try:
+        db.query(TicketAssignment).filter_by(ticket_id=tid, resolved_at=None) \
+          .update({"engineer_id": engineer, "assigned_at": datetime.utcnow()})
+        db.commit()
+    finally:
+        db.close()
+
 
 async def handle_ticket_webhook(payload: dict):
     # only urgent
@@ -20,9 +84,25 @@ async def handle_ticket_webhook(payload: dict):
     tid      = payload["ticket_id"]
     subject  = payload.get("subject","(no subject)")
     link     = payload.get("link")
-    engineer = find_available_engineer()
 
-    # 1) assign & note in ticket system
+    # 1) duplicate delivery? only once the DM went out is the ticket done;
+    #    an open assignment without it means an earlier attempt failed part
+    #    way, so redo the remaining steps for the same engineer
+    current = _open_assignment(tid)
+    if current and current[1]:
+        return {"status":"duplicate","engineer":current[0]}
+
+    # 2) record in DB before touching the ticket system or Slack
+    if current:
+        engineer = current[0]
+    else:
+        engineer = find_available_engineer()
+        if not _upsert_assignment(tid, engineer):
+            # another delivery of the same ticket won the race
+            return {"status":"duplicate","engineer":_open_assignment(tid)[0]}
+        record_event(tid, engineer, "assigned")
+
+    # 3) assign & note in ticket system
     assign_ticket(tid, engineer)
     add_internal_note(tid, f"Auto-assigned to <@{engineer}>")
 
@@ -32,9 +112,9 @@ async def handle_ticket_webhook(payload: dict):
         im = slack_client.conversations_open(users=[engineer])
         dm_channel = im["channel"]["id"]
     except SlackApiError as e:
-        # if even this fails, fall back to the channel they came from, or just bail
+        # the assignment is recorded but not notified; a retry redoes the DM
         print("❌ Could not open DM for", engineer, e)
-        return {"status":"error", "reason":"cannot_open_dm"}
+        return {"status":"error", "reason":"cannot_open_dm", "engineer":engineer}
 
     # ── SEND THE DM ──────────────────────────────────────────────────────────
     blocks = [
@@ -58,58 +138,9 @@ async def handle_ticket_webhook(payload: dict):
         )
     except SlackApiError as e:
         print("❌ Failed to post DM:", e)
-        # swallow or handle as you prefer
-
-    return {"status":"assigned","engineer":engineer}
-
-    # 2) record in DB
-    db = SessionLocal()
-    try:
-        existing = db.query(TicketAssignment)\
-                     .filter_by(ticket_id=tid)\
-                     .first()
-        if existing:
-            # update the engineer & reset resolved_at
-            existing.engineer_id = engineer
-            existing.assigned_at = datetime.utcnow()
-            existing.resolved_at = None
-        else:
-            new = TicketAssignment(
-                ticket_id   = tid,
-                engineer_id = engineer
-            )
-            db.add(new)
-        db.commit()
-
-    except IntegrityError:
-        db.rollback()
-        # (shouldn't happen now, but just in case)
-    finally:
-        db.close()
-
-    # 3) DM them with Accept/Escalate buttons
-    blocks = [
-      {"type":"section",
-       "text":{"type":"mrkdwn",
-         "text": f":rotating_light: *Urgent ticket* <{link}|{tid}> — {subject}"
-       }},
-      {"type":"actions","elements":[
-         {"type":"button",
-          "action_id":"accept_ticket",
-          "text":{"type":"plain_text","text":"Accept"},
-          "style":"primary","value":tid},
-         {"type":"button",
-          "action_id":"escalate_ticket",
-          "text":{"type":"plain_text","text":"Escalate"},
-          "style":"danger","value":tid}
-      ]}
-    ]
-    slack_client.chat_postMessage(
-        channel=engineer,
-        text=f"New urgent ticket {tid}",
-        blocks=blocks
-    )
+        return {"status":"error", "reason":"dm_failed", "engineer":engineer}
 
+    _mark_notified(tid)
     return {"status":"assigned","engineer":engineer}
 
 
@@ -122,11 +153,15 @@ async def handle_ticket_interaction(payload: dict):
         resolve = False
         add_internal_note(tid, f"{user} has *accepted* the ticket.")
         assign_ticket(tid, user)  # reassign if needed
+        record_event(tid, user, "accepted")
         text = f":white_check_mark: <@{user}> accepted ticket *{tid}*."
     else:  # escalate_ticket
         add_internal_note(tid, f"{user} escalated the ticket.")
         new_eng = find_available_engineer()
         assign_ticket(tid, new_eng)
+        _reassign(tid, new_eng)
+        record_event(tid, user, "escalated")
+        record_event(tid, new_eng, "assigned")
         text = f":rotating_light: <@{user}> escalated. New assignee: <@{new_eng}>."
 
     # update the original Slack message
@@ -156,17 +191,20 @@ async def handle_resolve_command(
     resolve_ticket(ticket_id)
     add_internal_note(ticket_id, f"Ticket resolved by <@{user_id}>")
 
-    # 2) mark in DB
+    # 2) mark in DB (whoever holds it now; an escalation may have moved it)
     db = SessionLocal()
     rec = (
         db.query(TicketAssignment)
-          .filter_by(ticket_id=ticket_id, engineer_id=user_id, resolved_at=None)
+          .filter_by(ticket_id=ticket_id, resolved_at=None)
           .first()
     )
+    resolved_at = None
     if rec:
-        rec.resolved_at = datetime.utcnow()
+        resolved_at = rec.resolved_at = datetime.utcnow()
         db.commit()
     db.close()
+    if resolved_at:
+        record_event(ticket_id, user_id, "resolved", ts=resolved_at)
 
     # 3) prepare Slack payload
     payload = {
@@ -4,7 +4,19 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 import smtplib
-from email.message import EmailMessage
+import asyncio
+import base64
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from email.header import Header
+from email.mime.text import MIMEText
+from email.policy import SMTP
+from email.utils import formatdate, make_msgid
 
 # ─── load .env from the project root ─────────────────────────────────────────
 env_path = Path(__file__).parent / ".env"
@@ -31,6 +43,165 @@ def get_smtp_connection():
     smtp.login(user, pwd)
     return smtp
 
+# ─── connection pool ──────────────────────────────────────────────────────────
+SMTP_POOL_SIZE   = int(os.getenv("SMTP_POOL_SIZE", 2))
+SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", 3))
+SMTP_IDLE_SECS   = 120          # most servers drop idle sessions after a few minutes
+ATTACH_CHUNK     = 57 * 1024    # multiple of 57 → base64 lines come out exactly 76 chars
+SEND_BLOCK       = 64 * 1024    # bytes buffered per socket write while streaming DATA
+
+
+def _close(smtp):
+    try:
+        smtp.quit()
+    except Exception:
+        smtp.close()
+
+class SMTPPool:
+    """
+    Keeps up to `size` authenticated SMTP sessions open and hands them out
+    one caller at a time, so STARTTLS + login is paid once per session
+    instead of once per email. Idle or dead sessions are replaced on checkout.
+    """
+
+    def __init__(self, size: int = SMTP_POOL_SIZE):
+        self._idle  = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _checkout(self):
+        while True:
+            try:
+                last_used, smtp = self._idle.get_nowait()
+            except queue.Empty:
+                return get_smtp_connection()
+            if time.monotonic() - last_used < SMTP_IDLE_SECS:
+                try:
+                    if smtp.noop()[0] == 250:
+                        return smtp
+                except (smtplib.SMTPException, OSError):
+                    pass
+            _close(smtp)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        smtp = None
+        try:
+            smtp = self._checkout()
+            yield smtp
+        except Exception:
+            # don't hand a session in an unknown state to the next caller
+            if smtp is not None:
+                _close(smtp)
+                smtp = None
+            raise
+        finally:
+            if smtp is not None:
+                self._idle.put((time.monotonic(), smtp))
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                _close(self._idle.get_nowait()[1])
+            except queue.Empty:
+                return
+
+_pool = SMTPPool()
+
+
+# ─── message building / streaming ────────────────────────────────────────────
+def _build_message(subject: str, body: str, tos: list[str], attachments: list[str]):
+    """
+    Write the MIME message to a spooled temp file, base64-encoding attachments
+    chunk by chunk so large files are never held in memory.
+    """
+    boundary = f"=={uuid.uuid4().hex}=="
+    out = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+
+    headers = [
+        f"From: {os.getenv('SMTP_USERNAME')}",
+        f"To: {', '.join(tos)}",
+        f"Subject: {Header(subject, 'utf-8').encode()}",
+        f"Date: {formatdate(localtime=True)}",
+        f"Message-ID: {make_msgid()}",
+        "MIME-Version: 1.0",
+        f'Content-Type: multipart/mixed; boundary="{boundary}"',
+    ]
+    out.write(("\r\n".join(headers) + "\r\n\r\n").encode())
+
+    out.write(f"--{boundary}\r\n".encode())
+    out.write(MIMEText(body, "plain", "utf-8").as_bytes(policy=SMTP))
+
+    for path in attachments:
+        filename = os.path.basename(path)
+        out.write(
+            f"\r\n--{boundary}\r\n"
+            "Content-Type: application/octet-stream\r\n"
+            "Content-Transfer-Encoding: base64\r\n"
+            f'Content-Disposition: attachment; filename="{filename}"\r\n\r\n'.encode()
+        )
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(ATTACH_CHUNK), b""):
+                out.write(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+
+    out.write(f"\r\n--{boundary}--\r\n".encode())
+    out.seek(0)
+    return out
+
+def _send_stream(smtp, sender: str, tos: list[str], fp):
+    """MAIL/RCPT/DATA by hand so the message body is streamed in SEND_BLOCK-sized writes."""
+    code, resp = smtp.mail(sender)
+    if code != 250:
+        smtp.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, sender)
+
+    refused = {}
+    for addr in tos:
+        code, resp = smtp.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+    if len(refused) == len(tos):
+        smtp.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, resp = smtp.docmd("DATA")
+    if code != 354:
+        smtp.rset()
+        raise smtplib.SMTPDataError(code, resp)
+    buf = bytearray()
+    for line in fp:
+        if line.startswith(b"."):
+            buf += b"."             # RFC 5321 dot-stuffing
+        buf += line
+        if len(buf) >= SEND_BLOCK:
+            smtp.send(bytes(buf))   # one write (and TLS record batch) per block, not per line
+            buf.clear()
+    buf += b".\r\n"
+    smtp.send(bytes(buf))
+    code, resp = smtp.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+def _send_one(smtp, message: dict):
+    # filter out any None or empty
+    tos = [addr for addr in message["to_addresses"] if addr]
+    if not tos:
+        raise RuntimeError("No valid recipient addresses supplied")
+    with _build_message(message["subject"], message["body"], tos,
+                        message.get("attachments") or []) as fp:
+        return _send_stream(smtp, os.getenv("SMTP_USERNAME"), tos, fp)
+
+def send_batch(messages: list[dict]) -> list[dict]:
+    """
+    Send several messages (dicts of send_email_via_smtp kwargs) over a
+    single pooled SMTP session. Returns the refused recipients per message.
+    """
+    with _pool.connection() as smtp:
+        return [_send_one(smtp, m) for m in messages]
+
 def send_email_via_smtp(
     subject: str,
     body: str,
@@ -39,30 +210,95 @@ def send_email_via_smtp(
 ):
     """
     Sends an email to the given addresses with the specified subject/body
-    and optional file attachments.
+    and optional file attachments, reusing a pooled SMTP session.
     """
-    # filter out any None or empty
-    tos = [addr for addr in to_addresses if addr]
-    if not tos:
-        raise RuntimeError("No valid recipient addresses supplied")
+    send_batch([dict(subject=subject, body=body,
+                     to_addresses=to_addresses, attachments=attachments)])
 
-    msg = EmailMessage()
-    msg["From"]    = os.getenv("SMTP_USERNAME")
-    msg["To"]      = ", ".join(tos)
-    msg["Subject"] = subject
-    msg.set_content(body)
 
-    # Attach any files
-    for path in attachments:
-        with open(path, "rb") as f:
-            data = f.read()
-        filename = os.path.basename(path)
-        maintype, subtype = "application", "octet-stream"
-        msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+# ─── background send queue ───────────────────────────────────────────────────
+_PERMANENT = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, RuntimeError, FileNotFoundError)
+
+class EmailQueue:
+    """
+    Background sender: callers get a Future back immediately. The worker
+    drains whatever is queued and sends it as one batch over one session,
+    retrying transient failures with exponential backoff.
+    """
+
+    def __init__(self, max_retries: int = SMTP_MAX_RETRIES, batch_size: int = 20):
+        self._q = queue.Queue()
+        self._max_retries = max_retries
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, **message) -> Future:
+        fut = Future()
+        self._q.put((message, fut))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="smtp-sender", daemon=True)
+                self._thread.start()
+        return fut
+
+    def _run(self):
+        while True:
+            jobs = [self._q.get()]
+            while len(jobs) < self._batch_size:
+                try:
+                    jobs.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._deliver(jobs)
+            finally:
+                for _ in jobs:
+                    self._q.task_done()
+
+    def _deliver(self, jobs):
+        pending = list(jobs)
+        for attempt in range(self._max_retries + 1):
+            try:
+                with _pool.connection() as smtp:
+                    while pending:
+                        message, fut = pending[0]
+                        try:
+                            fut.set_result(_send_one(smtp, message))
+                        except _PERMANENT as e:
+                            # bad message, healthy session: fail it and move on
+                            fut.set_exception(e)
+                        pending.pop(0)
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                # session-level failure: retry only what hasn't gone out yet
+                if attempt == self._max_retries:
+                    print("❌ Giving up on", len(pending), "email(s):", e)
+                    for _, fut in pending:
+                        fut.set_exception(e)
+                    return
+                time.sleep(2 ** attempt)
+            except Exception as e:
+                # anything else (e.g. missing SMTP config) won't fix itself on
+                # retry; fail the batch rather than kill the sender thread
+                print("❌ Email delivery failed for", len(pending), "email(s):", e)
+                for _, fut in pending:
+                    fut.set_exception(e)
+                return
+
+    def join(self):
+        self._q.join()
+
+email_queue = EmailQueue()
+
+def enqueue_email(subject: str, body: str, to_addresses: list[str], attachments: list[str] = []) -> Future:
+    """Queue an email for background delivery; returns a concurrent Future."""
+    return email_queue.submit(subject=subject, body=body,
+                              to_addresses=to_addresses, attachments=attachments)
 
-    smtp = get_smtp_connection()
-    smtp.send_message(msg)
-    smtp.quit()
+async def send_email_async(subject: str, body: str, to_addresses: list[str], attachments: list[str] = []):
+    """Awaitable wrapper around the send queue for FastAPI handlers."""
+    return await asyncio.wrap_future(enqueue_email(subject, body, to_addresses, attachments))
 
 # Optional smoke-test
 if __name__ == "__main__":
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from tools.cleaning_engine import CleaningEngine
+
+
+def test_later_float_chunk_is_not_truncated():
+    engine = CleaningEngine()
+    first = engine.clean(pd.DataFrame({"amount": [1, 2]}))
+    later = engine.clean(pd.DataFrame({"amount": [1.5, 2.75]}))
+    assert first["amount"].dtype == "Int64"
+    assert later["amount"].tolist() == [1.5, 2.75]
+
+
+def test_integer_width_is_fixed_across_chunks():
+    engine = CleaningEngine()
+    chunks = [engine.clean(pd.DataFrame({"n": pd.Series(v, dtype="int32")})) for v in ([1, 2], [3, 4])]
+    big = engine.clean(pd.DataFrame({"n": [2**40]}))
+    assert [c["n"].dtype for c in chunks + [big]] == ["Int64"] * 3
+
+
+def test_null_chunk_of_an_int_column_is_cast_back():
+    engine = CleaningEngine(dropna=None, source_types={"n": "int4"})
+    first = engine.clean(pd.DataFrame({"n": [3, 4]}))
+    later = engine.clean(pd.DataFrame({"n": [5.0, np.nan]}))
+    assert first["n"].dtype == later["n"].dtype == "Int32"
+    csv = pd.concat([first, later]).to_csv(index=False)
+    assert csv.split()[:4] == ["n", "3", "4", "5"]
+
+
+def test_downcast_follows_source_type():
+    df = pd.DataFrame({"a": [1], "b": [2]})
+    types = {"a": "int2", "b": "int8"}
+    assert CleaningEngine(source_types=types).clean(df).dtypes.tolist() == ["Int16", "Int64"]
+    assert CleaningEngine(source_types=types, downcast=False).clean(df).dtypes.tolist() == ["Int64", "Int64"]
+
+
+def test_dedupe_across_chunks():
+    engine = CleaningEngine(dedupe_on=["k"])
+    rng = np.random.default_rng(0)
+    chunks = [pd.DataFrame({"k": rng.integers(0, 500, 200)}) for _ in range(20)]
+    kept = pd.concat([engine.clean(c) for c in chunks])
+    expected = pd.concat(chunks).drop_duplicates("k")
+    assert kept["k"].tolist() == expected["k"].tolist()
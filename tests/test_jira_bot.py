@@ -0,0 +1,94 @@
+import pytest
+
+from tools import jira_bot
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status_code = status
+        self._body = body
+        self.content = b"x"
+        self.text = str(body)
+
+    def json(self):
+        return self._body
+
+
+class FakeJira:
+    """Stands in for the pooled session; records every request it gets."""
+
+    def __init__(self, fail_depts=(), bulk_status="COMPLETE", queue_polls=1):
+        self.calls = []
+        self.fail_depts = set(fail_depts)
+        self.bulk_status = bulk_status
+        self.queue_polls = queue_polls
+        self.n = 0
+
+    def request(self, method, url, timeout=None, json=None):
+        path = url.removeprefix(str(jira_bot.SITE))
+        self.calls.append((method, path))
+        if path.endswith("/components"):
+            return FakeResponse(200, [{"name": d, "id": d} for d in ("IT", "Security", "Facilities", "HR")])
+        if path == "/rest/api/3/issue/bulk":
+            issues, errors = [], []
+            for i, u in enumerate(json["issueUpdates"]):
+                if u["fields"]["components"][0]["id"] in self.fail_depts:
+                    errors.append({"status": 400, "failedElementNumber": i,
+                                   "elementErrors": {"errors": {"components": "not allowed"}}})
+                else:
+                    self.n += 1
+                    issues.append({"key": f"DO3-{self.n}"})
+            return FakeResponse(201, {"issues": issues, "errors": errors})
+        if path.endswith("/transitions") and method == "GET":
+            return FakeResponse(200, {"transitions": [{"id": "31", "to": {"name": "Done"}}]})
+        if path == "/rest/api/3/bulk/issues/transition":
+            self.closed = json["bulkTransitionInputs"][0]["selectedIssueIdsOrKeys"]
+            return FakeResponse(201, {"taskId": "7"})
+        if path == "/rest/api/3/bulk/queue/7":
+            self.queue_polls -= 1
+            status = "RUNNING" if self.queue_polls > 0 else self.bulk_status
+            return FakeResponse(200, {"status": status, "failedAccessibleIssues": {}})
+        return FakeResponse(204, {})
+
+
+@pytest.fixture
+def jira(monkeypatch):
+    def make(**kw):
+        fake = FakeJira(**kw)
+        monkeypatch.setattr(jira_bot, "session", fake)
+        monkeypatch.setattr(jira_bot, "_done_transitions", {})
+        jira_bot._components.cache_clear()
+        return fake
+    yield make
+    jira_bot._components.cache_clear()
+
+
+TASKS = [(d, f"{d}: Provision resources for A B") for d in ("IT", "Security", "Facilities", "HR")]
+
+
+def test_bulk_create_and_close(jira):
+    fake = jira()
+    assert jira_bot.create_and_close_tasks(TASKS) == ["DO3-1", "DO3-2", "DO3-3", "DO3-4"]
+    assert fake.closed == ["DO3-1", "DO3-2", "DO3-3", "DO3-4"]
+    fake.calls.clear()
+    jira_bot.create_and_close_tasks(TASKS)
+    # components and the Done transition are cached: create, transition, one status poll
+    assert [p for _, p in fake.calls] == ["/rest/api/3/issue/bulk", "/rest/api/3/bulk/issues/transition",
+                                         "/rest/api/3/bulk/queue/7"]
+
+
+def test_partial_failure_keeps_and_closes_created_issues(jira):
+    fake = jira(fail_depts={"HR"})
+    with pytest.raises(jira_bot.JiraBulkError) as exc:
+        jira_bot.create_and_close_tasks(TASKS)
+    assert exc.value.keys == ["DO3-1", "DO3-2", "DO3-3", None]
+    assert list(exc.value.failures) == [3]
+    assert "HR" in str(exc.value) and "IT" not in str(exc.value).split("(created")[0]
+    assert fake.closed == ["DO3-1", "DO3-2", "DO3-3"]
+
+
+def test_bulk_transition_result_is_checked(jira, monkeypatch):
+    monkeypatch.setattr(jira_bot.time, "sleep", lambda s: None)
+    jira(bulk_status="FAILED", queue_polls=3)
+    with pytest.raises(RuntimeError, match="failed"):
+        jira_bot.create_and_close_tasks(TASKS)
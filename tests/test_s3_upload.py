@@ -0,0 +1,91 @@
+import hashlib
+import os
+
+import boto3
+import pandas as pd
+import pytest
+from moto import mock_aws
+
+from tools import data_cleaner
+
+BUCKET = "bella-exports"
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    """In-process moto S3 with a 5 MB part size (S3's minimum) so multipart kicks in early."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("S3_BUCKET", BUCKET)
+    monkeypatch.delenv("S3_ENDPOINT_URL", raising=False)
+    monkeypatch.setattr(data_cleaner, "S3_PART_MB", 5)
+    monkeypatch.setattr(data_cleaner.tempfile, "tempdir", str(tmp_path))
+    with mock_aws():
+        data_cleaner._s3_client.cache_clear()
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+    data_cleaner._s3_client.cache_clear()
+
+
+def _big_file(tmp_path, mb=11):
+    path = tmp_path / "big.csv"
+    path.write_bytes(os.urandom(mb * 1024 * 1024))
+    return path
+
+
+def test_large_file_goes_up_as_multipart(s3, tmp_path):
+    path = _big_file(tmp_path)
+    sha = hashlib.sha256(path.read_bytes()).hexdigest()
+
+    url = data_cleaner.upload_to_s3(str(path), "exports/big.csv", sha)
+
+    head = s3.head_object(Bucket=BUCKET, Key="exports/big.csv")
+    assert head["ETag"].strip('"').endswith("-3")          # 11 MB in 5 MB parts
+    assert head["Metadata"]["sha256"] == sha
+    assert head["ContentLength"] == path.stat().st_size
+    assert "exports/big.csv" in url
+
+
+def test_identical_upload_is_skipped(s3, tmp_path, monkeypatch):
+    path = tmp_path / "small.csv"
+    path.write_text("a,b\n1,2\n")
+    sha = hashlib.sha256(path.read_bytes()).hexdigest()
+    data_cleaner.upload_to_s3(str(path), "small.csv", sha)
+
+    calls = []
+    client = data_cleaner._s3_client()
+    real = client.upload_file
+    monkeypatch.setattr(client, "upload_file", lambda *a, **k: (calls.append(a), real(*a, **k)))
+
+    data_cleaner.upload_to_s3(str(path), "small.csv", sha)
+    assert calls == []
+
+    path.write_text("a,b\n1,3\n")
+    data_cleaner.upload_to_s3(str(path), "small.csv", hashlib.sha256(path.read_bytes()).hexdigest())
+    assert len(calls) == 1
+
+
+def test_streamed_upload_matches_local_output(s3):
+    chunks = [pd.DataFrame({"id": range(i, i + 50_000), "name": [f"n{j}" for j in range(50_000)]})
+              for i in range(0, 200_000, 50_000)]
+    stats = {}
+
+    url, md5 = data_cleaner.process_chunks(iter(chunks), "streamed.csv", stats=stats, stream=True)
+
+    body = s3.get_object(Bucket=BUCKET, Key="streamed.csv")["Body"].read()
+    assert hashlib.md5(body).hexdigest() == md5 == stats["md5"]
+    assert stats["rows"] == 200_000
+    assert body.count(b"\n") == 200_001
+    assert "streamed.csv" in url
+
+
+def test_failed_stream_leaves_no_object(s3):
+    with pytest.raises(ValueError):
+        with data_cleaner.s3_stream_writer("broken.csv") as out:
+            out.write(b"x" * (6 * 1024 * 1024))
+            raise ValueError("export failed mid-way")
+
+    assert "Contents" not in s3.list_objects_v2(Bucket=BUCKET)
+    assert "Uploads" not in s3.list_multipart_uploads(Bucket=BUCKET)
@@ -0,0 +1,108 @@
+import base64
+import email
+import smtplib
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import smtp_utils
+
+
+class Inbox:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtpd(monkeypatch):
+    """A local aiosmtpd server standing in for the real relay (no TLS/auth)."""
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    connects = []
+
+    def connect():
+        connects.append(1)
+        smtp = smtplib.SMTP(controller.hostname, controller.port)
+        smtp.ehlo()
+        return smtp
+
+    monkeypatch.setenv("SMTP_USERNAME", "bella@example.com")
+    monkeypatch.setattr(smtp_utils, "get_smtp_connection", connect)
+    monkeypatch.setattr(smtp_utils, "_pool", smtp_utils.SMTPPool(size=1))
+    monkeypatch.setattr(smtp_utils, "email_queue", smtp_utils.EmailQueue(max_retries=0))
+    yield inbox, connects
+    smtp_utils._pool.close_all()
+    controller.stop()
+
+
+def test_attachment_streams_intact_with_dot_stuffing(smtpd, tmp_path):
+    inbox, _ = smtpd
+    payload = bytes(range(256)) * 2000            # ~500 KB, several SEND_BLOCKs
+    path = tmp_path / "report.bin"
+    path.write_bytes(payload)
+
+    smtp_utils.send_email_via_smtp("Weekly", "hello\n.leading dot\nbye", ["a@example.com"], [str(path)])
+
+    [env] = inbox.messages
+    msg = email.message_from_bytes(env.content)
+    body, attachment = msg.get_payload()
+    assert ".leading dot" in body.get_payload(decode=True).decode()
+    assert attachment.get_filename() == "report.bin"
+    assert base64.b64decode(attachment.get_payload()) == payload
+
+
+def test_body_is_sent_in_blocks_not_lines(smtpd, tmp_path):
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"x" * 300_000)              # ~5300 base64 lines
+    sends = []
+    with smtp_utils._pool.connection() as smtp:
+        real_send = smtp.send
+        smtp.send = lambda data: (sends.append(len(data)), real_send(data))[1]
+        smtp_utils._send_one(smtp, dict(subject="s", body="b", to_addresses=["a@example.com"],
+                                        attachments=[str(path)]))
+    data_sends = [n for n in sends if n > 100]
+    assert len(data_sends) <= 400_000 // smtp_utils.SEND_BLOCK + 1
+    assert max(data_sends) >= smtp_utils.SEND_BLOCK
+
+
+def test_pool_reuses_one_session(smtpd):
+    inbox, connects = smtpd
+    for i in range(3):
+        smtp_utils.send_email_via_smtp(f"s{i}", "b", ["a@example.com"])
+    assert len(inbox.messages) == 3
+    assert len(connects) == 1
+
+
+def test_queue_delivers_batch(smtpd):
+    inbox, _ = smtpd
+    futures = [smtp_utils.enqueue_email(f"s{i}", "b", ["a@example.com"]) for i in range(5)]
+    assert [f.result(timeout=10) for f in futures] == [{}] * 5
+    assert len(inbox.messages) == 5
+
+
+def test_queue_fails_futures_when_config_missing(monkeypatch):
+    for var in ("SMTP_SERVER", "SMTP_USERNAME", "SMTP_PASSWORD"):
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setattr(smtp_utils, "_pool", smtp_utils.SMTPPool(size=1))
+    q = smtp_utils.EmailQueue(max_retries=0)
+
+    fut = q.submit(subject="s", body="b", to_addresses=["a@example.com"])
+    with pytest.raises(RuntimeError, match="Missing one of SMTP"):
+        fut.result(timeout=5)
+    # the sender thread survived and keeps serving the queue
+    fut = q.submit(subject="s", body="b", to_addresses=["a@example.com"])
+    with pytest.raises(RuntimeError):
+        fut.result(timeout=5)
+    assert q._thread.is_alive()
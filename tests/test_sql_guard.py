@@ -0,0 +1,26 @@
+import pytest
+
+from tools import db_tools, sql_guard
+
+
+@pytest.mark.parametrize("sql, n", [
+    ("SELECT 1", 1),
+    ("SELECT 1;", 1),
+    ("SELECT 1; -- done", 1),
+    ("SELECT ';' AS a, \"x;y\" FROM t /* ; */", 1),
+    ("SELECT $tag$ ; $tag$, E'it\\'s; fine'", 1),
+    ("SELECT 1) AS sub; DELETE FROM t; EXPLAIN (FORMAT JSON) SELECT (1", 3),
+    ("SELECT 1; DROP TABLE t", 2),
+])
+def test_statements(sql, n):
+    assert len(sql_guard.statements(sql)) == n
+
+
+def test_check_rejects_smuggled_statement_without_touching_db(monkeypatch):
+    def boom(*args, **kwargs):
+        raise AssertionError("reached the database")
+    monkeypatch.setattr(db_tools, "explain_query", boom)
+    monkeypatch.setattr(sql_guard.schema_catalog, "get_catalog", boom)
+
+    verdict = sql_guard.check("SELECT 1) AS sub; DELETE FROM t; EXPLAIN (FORMAT JSON) SELECT (1")
+    assert verdict["action"] == "reject"
@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+os.environ.setdefault("SLACK_BOT_TOKEN", "x")
+
+import pytest
+from slack_sdk.errors import SlackApiError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import ticket_metrics
+from models import Base, TicketAssignment, TicketEvent
+from slack_handlers import tickets
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'worklogs.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(tickets, "SessionLocal", Session)
+    monkeypatch.setattr(ticket_metrics, "SessionLocal", Session)
+    return Session
+
+
+class FakeSlack:
+    def __init__(self, fail_posts=0):
+        self.posts = []
+        self.fail_posts = fail_posts
+
+    def conversations_open(self, users):
+        return {"channel": {"id": f"D-{users[0]}"}}
+
+    def chat_postMessage(self, **kwargs):
+        self.posts.append(kwargs)
+        if len(self.posts) <= self.fail_posts:
+            raise SlackApiError("boom", {"ok": False})
+
+
+@pytest.fixture
+def slack(monkeypatch):
+    def make(fail_posts=0):
+        fake = FakeSlack(fail_posts)
+        monkeypatch.setattr(tickets, "slack_client", fake)
+        return fake
+    monkeypatch.setattr(tickets, "find_available_engineer", lambda: "U1")
+    monkeypatch.setattr(tickets, "assign_ticket", lambda tid, eng: None)
+    monkeypatch.setattr(tickets, "add_internal_note", lambda tid, note: None)
+    return make
+
+
+def test_failed_dm_is_retried_not_treated_as_duplicate(session, slack):
+    fake = slack(fail_posts=1)
+    webhook = lambda: asyncio.run(tickets.handle_ticket_webhook({"ticket_id": "TK-1"}))
+
+    assert webhook()["reason"] == "dm_failed"
+    assert webhook() == {"status": "assigned", "engineer": "U1"}
+    assert webhook() == {"status": "duplicate", "engineer": "U1"}
+
+    assert len(fake.posts) == 2
+    db = session()
+    assert db.query(TicketEvent).filter_by(ticket_id="TK-1", event="assigned").count() == 1
+    assert db.query(TicketAssignment).filter_by(ticket_id="TK-1").one().notified_at is not None
+
+
+def test_escalated_ticket_resolves_for_new_engineer(session, slack, monkeypatch):
+    fake = slack()
+    fake.chat_update = lambda **kwargs: None
+    asyncio.run(tickets.handle_ticket_webhook({"ticket_id": "TK-2"}))
+
+    monkeypatch.setattr(tickets, "find_available_engineer", lambda: "U2")
+    asyncio.run(tickets.handle_ticket_interaction({
+        "actions": [{"action_id": "escalate_ticket", "value": "TK-2"}],
+        "user": {"id": "U1"},
+        "container": {"channel_id": "D-U1", "message_ts": "1"},
+    }))
+    monkeypatch.setattr(tickets, "resolve_ticket", lambda tid: None)
+    asyncio.run(tickets.handle_resolve_command("TK-2", "U2"))
+
+    db = session()
+    assert db.query(TicketAssignment).filter_by(ticket_id="TK-2").one().resolved_at is not None
+    assert db.query(TicketEvent).filter_by(ticket_id="TK-2", event="resolved", engineer_id="U2").count() == 1
+    assert [r["metric"] for r in ticket_metrics.get_ticket_rollups("U2")] == ["resolution"]
@@ -0,0 +1,126 @@
+# ticket_metrics.py
+import json
+import math
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db import SessionLocal
+from models import TicketEvent, TicketLatencyRollup
+
+# latencies are bucketed on a geometric scale (each bucket ~20% wider than the
+# last), so percentiles can be updated incrementally without keeping samples
+BUCKET_BASE = 1.2
+PERCENTILES = {"p50": 0.50, "p90": 0.90, "p99": 0.99}
+RESPONSE_EVENTS = ("accepted", "escalated")
+
+
+def _bucket(seconds: float) -> int:
+    return math.ceil(math.log(max(seconds, 1.0), BUCKET_BASE))
+
+def _percentile(buckets: dict, count: int, q: float) -> float:
+    """Upper bound (seconds) of the bucket holding the q-th latency."""
+    rank = math.ceil(q * count)
+    seen = 0
+    for k in sorted(buckets, key=int):
+        seen += buckets[k]
+        if seen >= rank:
+            return round(BUCKET_BASE ** int(k), 1)
+    return 0.0
+
+def _add_sample(db, engineer_id: str, day, metric: str, seconds: float):
+    """
+    Fold one latency into the rollup row with a single INSERT ... ON CONFLICT
+    DO UPDATE that bumps the bucket in SQL, so two events racing for the same
+    engineer/day both land instead of one failing on the unique constraint.
+    The percentiles are then recomputed while this transaction holds the write lock.
+    """
+    R = TicketLatencyRollup
+    k = str(_bucket(seconds))
+    path = f'$."{k}"'
+    stmt = sqlite_insert(R).values(
+        engineer_id=engineer_id, day=day, metric=metric, count=1, buckets=json.dumps({k: 1})
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[R.engineer_id, R.day, R.metric],
+        set_={
+            "count":   func.coalesce(R.count, 0) + 1,
+            "buckets": func.json_set(func.coalesce(R.buckets, "{}"), path,
+                                     func.coalesce(func.json_extract(R.buckets, path), 0) + 1),
+        },
+    ).returning(R.id, R.count, R.buckets)
+
+    roll_id, count, buckets = db.execute(stmt).one()
+    buckets = json.loads(buckets)
+    db.execute(
+        update(R).where(R.id == roll_id)
+                 .values(**{name: _percentile(buckets, count, q) for name, q in PERCENTILES.items()})
+    )
+
+def record_event(ticket_id: str, engineer_id: str, event: str, ts: Optional[datetime] = None):
+    """
+    Append a lifecycle event and fold any latency it completes into the rollups:
+     - first accepted/escalated after an assignment → first_response
+     - resolved → resolution
+    Both are measured from the latest `assigned` event for the ticket and
+    credited to the engineer that assignment went to.
+    """
+    ts = ts or datetime.utcnow()
+    db = SessionLocal()
+    try:
+        assigned = None
+        if event != "assigned":
+            assigned = (
+                db.query(TicketEvent)
+                  .filter_by(ticket_id=ticket_id, event="assigned")
+                  .order_by(TicketEvent.ts.desc())
+                  .first()
+            )
+
+        if assigned and event in RESPONSE_EVENTS:
+            responded = (
+                db.query(TicketEvent.id)
+                  .filter(TicketEvent.ticket_id == ticket_id,
+                          TicketEvent.event.in_(RESPONSE_EVENTS),
+                          TicketEvent.ts >= assigned.ts)
+                  .first()
+            )
+            if not responded:
+                secs = (ts - assigned.ts).total_seconds()
+                _add_sample(db, assigned.engineer_id, assigned.ts.date(), "first_response", secs)
+        elif assigned and event == "resolved":
+            secs = (ts - assigned.ts).total_seconds()
+            _add_sample(db, assigned.engineer_id, assigned.ts.date(), "resolution", secs)
+
+        db.add(TicketEvent(ticket_id=ticket_id, engineer_id=engineer_id, event=event, ts=ts))
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_ticket_rollups(engineer_id: Optional[str] = None, day=None) -> list[dict]:
+    """Read the precomputed percentiles; never scans the event log."""
+    db = SessionLocal()
+    try:
+        q = db.query(TicketLatencyRollup)
+        if engineer_id:
+            q = q.filter_by(engineer_id=engineer_id)
+        if day:
+            q = q.filter_by(day=day)
+        rows = q.order_by(TicketLatencyRollup.day.desc(), TicketLatencyRollup.engineer_id).all()
+        return [
+            {
+                "engineer_id": r.engineer_id,
+                "day":         r.day.isoformat(),
+                "metric":      r.metric,
+                "count":       r.count,
+                "p50_s":       r.p50,
+                "p90_s":       r.p90,
+                "p99_s":       r.p99,
+            }
+            for r in rows
+        ]
+    finally:
+        db.close()
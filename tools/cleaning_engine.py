@@ -0,0 +1,138 @@
+import numpy as np, pandas as pd
+from pandas._libs.hashtable import UInt64HashTable
+from pandas.tseries.api import guess_datetime_format
+
+# Postgres type name (db_tools.describe_query) → pandas dtype. Nullable
+# extension types keep every chunk on the same dtype whether or not it has NULLs.
+# The declared integer width is one no chunk can outgrow, so it is safe to
+# downcast to; psycopg2 hands every integer back as int64 (or float with NULLs).
+PG_INT_DTYPES = {"int2": "Int16", "int4": "Int32", "int8": "Int64"}
+PG_DTYPES = {
+    "float4": "float32", "float8": "float64",
+    "bool": "boolean",
+}
+PG_DATE_TYPES = {"date", "timestamp", "timestamptz"}
+PLAN_SAMPLE_ROWS = 10_000      # rows inspected when choosing a column's dtype
+
+
+class CleaningEngine:
+    """
+    Vectorised, chunk-aware version of the basic cleaning rules.
+
+    Per-column rules are declarative, keyed by the cleaned (lower-cased) name:
+        {"signup_date": {"format": "%d/%m/%Y"},
+         "country":     {"dtype": "category"},
+         "amount":      {"dtype": "float32"}}
+
+    Everything not covered by a rule is planned once, from the first chunk
+    (or from `source_types`, e.g. db_tools.describe_query), and that plan is
+    reused for every later chunk so dtypes stay identical across chunks:
+      - `*_date` columns are parsed with an explicit format — declared, or
+        guessed once from the first value — using pandas' unique-value cache
+      - integer columns become nullable integers: downcast to their source
+        type's width (int2/int4 → Int16/Int32) when known, else Int64. A later
+        chunk that arrives as float because of NULLs is cast back; one with
+        fractional values is left as is rather than truncated
+      - low-cardinality strings become categoricals
+    `dedupe_on` drops rows whose key was already seen in this or any earlier chunk.
+    """
+
+    def __init__(self, rules: dict | None = None, dedupe_on: list[str] | None = None,
+                 dropna: str | list[str] | None = "any", source_types: dict | None = None,
+                 downcast: bool = True, category_max_ratio: float = 0.5,
+                 category_max_unique: int = 1000):
+        self.rules = {k.lower().strip(): v for k, v in (rules or {}).items()}
+        self.dedupe_on = [c.lower().strip() for c in dedupe_on or []]
+        self.dropna = dropna
+        self.source_types = {k.lower().strip(): v for k, v in (source_types or {}).items()}
+        self.downcast = downcast
+        self.category_max_ratio = category_max_ratio
+        self.category_max_unique = category_max_unique
+        self._plan: dict | None = None
+        self._seen = UInt64HashTable()        # dedupe key hashes from earlier chunks
+
+    # ── planning (first chunk only) ──────────────────────────────────────────
+    def _plan_column(self, col: str, s: pd.Series) -> tuple[str, object]:
+        rule = self.rules.get(col, {})
+        src = self.source_types.get(col)
+
+        if "format" in rule or rule.get("dtype") == "datetime" or col.endswith("_date") or src in PG_DATE_TYPES:
+            fmt = rule.get("format")
+            if fmt is None:
+                first = s.dropna()
+                first = first.iloc[0] if len(first) else None
+                fmt = guess_datetime_format(first) if isinstance(first, str) else None
+            return "datetime", fmt
+        if rule.get("dtype") == "category":
+            return "category", None
+        if "dtype" in rule:
+            return "astype", rule["dtype"]
+        if src in PG_INT_DTYPES:
+            return "int", PG_INT_DTYPES[src] if self.downcast else "Int64"
+        if src in PG_DTYPES:
+            return "astype", PG_DTYPES[src]
+        if pd.api.types.is_integer_dtype(s.dtype):
+            return "int", "Int64"
+        sample = s.iloc[:PLAN_SAMPLE_ROWS]
+        if len(sample) and pd.api.types.infer_dtype(sample, skipna=True) == "string":
+            nunique = sample.nunique(dropna=True)
+            if nunique <= self.category_max_unique and nunique <= self.category_max_ratio * len(sample):
+                return "category", None
+        return "keep", None
+
+    # ── per-chunk work ───────────────────────────────────────────────────────
+    def _apply(self, col: str, s: pd.Series) -> pd.Series:
+        kind, arg = self._plan.get(col, ("keep", None))
+        if kind == "datetime":
+            if pd.api.types.is_datetime64_any_dtype(s.dtype):
+                return s
+            return pd.to_datetime(s, format=arg, errors="coerce", cache=True)
+        if kind == "int":
+            if pd.api.types.is_float_dtype(s.dtype):
+                v = s.to_numpy(dtype="float64", na_value=np.nan)
+                v = v[~np.isnan(v)]
+                if not (np.isfinite(v).all() and (v == np.trunc(v)).all()):
+                    return s
+            elif not pd.api.types.is_integer_dtype(s.dtype):
+                return s
+            return s.astype(arg)
+        if kind == "astype":
+            return s.astype(arg)
+        return s
+
+    def clean(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df.copy(deep=False)
+        df.columns = [c.lower().strip() for c in df.columns]
+        if self._plan is None:
+            self._plan = {col: self._plan_column(col, df[col]) for col in df.columns}
+
+        with pd.option_context("mode.chained_assignment", None):
+            # categoricals first: NaN survives the conversion, and the null
+            # check below is then a cheap scan of integer codes, not strings
+            for col in df.columns:
+                if self._plan.get(col, ("keep",))[0] == "category":
+                    df[col] = df[col].astype("category")
+
+            if self.dropna == "any":
+                df = df.dropna()                        # drop null rows
+            elif isinstance(self.dropna, list):
+                df = df.dropna(subset=[c.lower().strip() for c in self.dropna])
+
+            for col in df.columns:
+                converted = self._apply(col, df[col])
+                if converted is not df[col]:
+                    df[col] = converted
+
+        if self.dedupe_on and len(df):
+            df = df[self._first_seen(pd.util.hash_pandas_object(df[self.dedupe_on], index=False).to_numpy())]
+        return df
+
+    def _first_seen(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Mask of keys not seen earlier in this or any previous chunk. Both checks
+        run in pandas' hash tables, with no per-row Python.
+        """
+        keep = ~pd.Series(keys).duplicated().to_numpy()
+        keep &= self._seen.lookup(keys) < 0
+        self._seen.map_locations(keys[keep])
+        return keep
@@ -1,40 +1,365 @@
-import hashlib, pandas as pd, os, tempfile, boto3
+import hashlib, io, pandas as pd, os, tempfile, threading, boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
+from contextlib import contextmanager
+from functools import lru_cache
+from tools.cleaning_engine import CleaningEngine
+from typing import Iterable
 
 def _basic_preprocess(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.dropna()                            # drop null rows
-    df.columns = [c.lower().strip() for c in df.columns]
-    # convert any “*_date” column to proper datetime
-    for col in df.columns:
-        if col.endswith("_date"):
-            df[col] = pd.to_datetime(df[col], errors="coerce")
-    return df
-
-def save_and_checksum(df: pd.DataFrame, fname: str) -> tuple[str, str]:
-    tmp_dir = tempfile.gettempdir()
-    path = os.path.join(tmp_dir, fname)
-    df.to_csv(path, index=False)
-    md5 = hashlib.md5(open(path, "rb").read()).hexdigest()
-    return path, md5
-
-def upload_to_s3(local_path: str, key: str) -> str:
-    """Return presigned URL (5 days) or local path if no S3 env vars set."""
-    bucket = os.getenv("S3_BUCKET")
-    if not bucket:
-        return local_path
-    s3 = boto3.client(
+    """Drop null rows, lower-case headers, parse “*_date” columns (see CleaningEngine)."""
+    return CleaningEngine().clean(df)
+
+DATE_TYPES = {"date", "timestamp", "timestamptz"}
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def pushdown_clean_sql(sql: str, columns: list[tuple[str, str]]) -> str | None:
+    """
+    Express _basic_preprocess as SQL around `sql`, so COPY can export
+    already-clean rows: null-row filter → WHERE, lower-cased headers → aliases,
+    booleans rendered the way pandas writes them. `*_date` columns that are
+    already date/timestamp types need no cast; a text `*_date` column needs
+    pandas' lenient parsing, so None is returned and the caller falls back.
+    """
+    selects, not_null = [], []
+    for name, typ in columns:
+        clean = name.lower().strip()
+        if clean.endswith("_date") and typ not in DATE_TYPES:
+            return None
+        col = _quote_ident(name)
+        expr = f"CASE WHEN {col} THEN 'True' ELSE 'False' END" if typ == "bool" else col
+        selects.append(f"{expr} AS {_quote_ident(clean)}")
+        not_null.append(f"{col} IS NOT NULL")
+    return (
+        f"SELECT {', '.join(selects)} FROM ({sql}) AS src"
+        f" WHERE {' AND '.join(not_null) or 'TRUE'}"
+    )
+
+class HashingWriter(io.RawIOBase):
+    """
+    Write-through wrapper that hashes (MD5 + SHA-256) and counts bytes as
+    they go to the underlying binary stream, so a file never has to be
+    read back to checksum it. Callers add to `rows` as they write.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._md5 = hashlib.md5()
+        self._sha256 = hashlib.sha256()
+        self.bytes = 0
+        self.lines = 0
+        self.rows = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = b if isinstance(b, bytes) else bytes(b)
+        self._raw.write(data)
+        self._md5.update(data)
+        self._sha256.update(data)
+        self.bytes += len(data)
+        self.lines += data.count(b"\n")
+        return len(data)
+
+    def tell(self) -> int:
+        return self.bytes
+
+    def flush(self):
+        self._raw.flush()
+
+    def stats(self) -> dict:
+        return {"bytes": self.bytes, "rows": self.rows,
+                "md5": self._md5.hexdigest(), "sha256": self._sha256.hexdigest()}
+
+@contextmanager
+def _hashed_output(fname: str, stats: dict | None, text: bool = False, s3_key: str | None = None):
+    """
+    Open <tmp>/<fname> (or, with `s3_key`, a streaming S3 upload) behind a
+    HashingWriter; fills `stats` once the output is closed.
+    """
+    if s3_key:
+        path, sink = f"s3://{os.getenv('S3_BUCKET')}/{s3_key}", s3_stream_writer(s3_key)
+    else:
+        path = os.path.join(tempfile.gettempdir(), fname)
+        sink = open(path, "wb")
+    with sink as raw:
+        hw = HashingWriter(raw)
+        if text:
+            out = io.TextIOWrapper(io.BufferedWriter(hw), encoding="utf-8", newline="")
+            yield path, hw, out
+            out.flush()
+            out.detach()
+        else:
+            yield path, hw, hw
+    if stats is not None:
+        stats.update(hw.stats())
+
+def save_and_checksum(df: pd.DataFrame, fname: str, stats: dict | None = None) -> tuple[str, str]:
+    stats = {} if stats is None else stats
+    with _hashed_output(fname, stats, text=True) as (path, hw, out):
+        df.to_csv(out, index=False)
+        hw.rows = len(df)
+    return path, stats["md5"]
+
+def save_chunks_and_checksum(chunks: Iterable[pd.DataFrame], fname: str,
+                             stats: dict | None = None, s3_key: str | None = None,
+                             clean=_basic_preprocess) -> tuple[str, str]:
+    """Clean and append each chunk to the CSV as it arrives; only one chunk is in memory."""
+    stats = {} if stats is None else stats
+    with _hashed_output(fname, stats, text=True, s3_key=s3_key) as (path, hw, out):
+        for i, chunk in enumerate(chunks):
+            chunk = clean(chunk)
+            chunk.to_csv(out, index=False, header=(i == 0))
+            hw.rows += len(chunk)
+    return path, stats["md5"]
+
+def save_copy_and_checksum(copy_to, fname: str, stats: dict | None = None,
+                           s3_key: str | None = None) -> tuple[str, str]:
+    """`copy_to(fileobj)` writes CSV bytes (e.g. db_tools.copy_query_to) straight to disk."""
+    stats = {} if stats is None else stats
+    with _hashed_output(fname, stats, s3_key=s3_key) as (path, hw, out):
+        copy_to(out)
+        hw.rows = max(hw.lines - 1, 0)     # minus the header line
+    return path, stats["md5"]
+
+PARQUET_DEFAULTS = dict(
+    compression="zstd",
+    compression_level=3,
+    row_group_size=128_000,
+    use_dictionary=True,
+)
+
+def _with_ext(fname: str, ext: str) -> str:
+    return os.path.splitext(fname)[0] + ext
+
+def save_parquet_and_checksum(chunks: Iterable[pd.DataFrame], fname: str,
+                              stats: dict | None = None, s3_key: str | None = None,
+                              source_types: dict | None = None, **parquet_opts) -> tuple[str, str]:
+    """
+    Write already-cleaned chunks to one Parquet file as they arrive.
+    The Arrow schema is inferred from the first non-empty chunk (untyped
+    columns from `source_types`, Postgres type names) and reused (cast) for
+    the rest, so every row group has identical types.
+    """
+    opts = {**PARQUET_DEFAULTS, **parquet_opts}
+    row_group_size = opts.pop("row_group_size")
+    stats = {} if stats is None else stats
+
+    with _hashed_output(fname, stats, s3_key=s3_key) as (path, hw, out):
+        _write_parquet(chunks, out, hw, row_group_size, opts, source_types)
+    return path, stats["md5"]
+
+def _arrow_schema(chunk: pd.DataFrame, source_types: dict | None):
+    """
+    Arrow schema for `chunk`. Columns pandas can't type (all-null object
+    columns come out as Arrow `null`) take their type from the Postgres
+    source type instead, falling back to string.
+    """
+    import pyarrow as pa
+    pg_arrow = {
+        "int2": pa.int16(), "int4": pa.int32(), "int8": pa.int64(),
+        "float4": pa.float32(), "float8": pa.float64(), "bool": pa.bool_(),
+        "date": pa.date32(), "timestamp": pa.timestamp("ns"), "timestamptz": pa.timestamp("ns", tz="UTC"),
+    }
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            typ = pg_arrow.get((source_types or {}).get(field.name), pa.string())
+            schema = schema.set(i, field.with_type(typ))
+    return schema
+
+def _write_parquet(chunks, out, hw, row_group_size, opts, source_types=None):
+    import pyarrow as pa, pyarrow.parquet as pq
+
+    writer, pending, pending_rows, empty = None, [], 0, None
+    try:
+        for chunk in chunks:
+            # Parquet dictionary-encodes on its own; plain values keep the
+            # schema identical however many categories each chunk has
+            cats = [c for c in chunk.columns if isinstance(chunk[c].dtype, pd.CategoricalDtype)]
+            if cats:
+                chunk = chunk.astype({c: chunk[c].cat.categories.dtype for c in cats})
+            if writer is None:
+                if chunk.empty:
+                    # e.g. every row dropped for NULLs: its object columns
+                    # carry no type, so wait for a chunk with rows
+                    empty = chunk
+                    continue
+                writer = pq.ParquetWriter(out, _arrow_schema(chunk, source_types), **opts)
+            table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            # buffer small chunks so row groups come out at row_group_size
+            pending.append(table)
+            pending_rows += table.num_rows
+            hw.rows += table.num_rows
+            if pending_rows >= row_group_size:
+                buffered = pa.concat_tables(pending)
+                full = (pending_rows // row_group_size) * row_group_size
+                writer.write_table(buffered.slice(0, full), row_group_size=row_group_size)
+                pending = [buffered.slice(full)]
+                pending_rows -= full
+        if writer is None and empty is not None:
+            # nothing survived cleaning: still write a valid, typed, empty file
+            writer = pq.ParquetWriter(out, _arrow_schema(empty, source_types), **opts)
+        if pending_rows:
+            writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+    finally:
+        if writer is not None:
+            writer.close()
+
+S3_PART_MB         = int(os.getenv("S3_PART_MB", 16))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 8))
+PRESIGN_SECONDS    = 86400 * 5
+
+@lru_cache(maxsize=1)
+def _s3_client():
+    """One client per process: boto3 clients are thread-safe and expensive to build."""
+    return boto3.client(
         "s3",
         aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
         aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        endpoint_url=os.getenv("S3_ENDPOINT_URL"),     # MinIO / moto for local runs
+        config=Config(max_pool_connections=S3_MAX_CONCURRENCY * 2),
+    )
+
+def _transfer_config() -> TransferConfig:
+    part = S3_PART_MB * 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=part,
+        multipart_chunksize=part,
+        max_concurrency=S3_MAX_CONCURRENCY,
+        use_threads=True,
     )
-    s3.upload_file(local_path, bucket, key)
-    return s3.generate_presigned_url(
+
+def _presign(bucket: str, key: str) -> str:
+    return _s3_client().generate_presigned_url(
         "get_object",
         Params={"Bucket": bucket, "Key": key},
-        ExpiresIn=86400 * 5,
+        ExpiresIn=PRESIGN_SECONDS,
+    )
+
+def _remote_sha256(bucket: str, key: str) -> str | None:
+    try:
+        return _s3_client().head_object(Bucket=bucket, Key=key)["Metadata"].get("sha256")
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+@contextmanager
+def s3_stream_writer(key: str):
+    """
+    Yield a binary file object whose bytes are multipart-uploaded to
+    S3_BUCKET/<key> while they are written — no local temp file. Memory is
+    bounded by part size × concurrency. If the body raises, the partial
+    object is deleted.
+    """
+    bucket = os.getenv("S3_BUCKET")
+    r, w = os.pipe()
+    reader, writer = os.fdopen(r, "rb"), os.fdopen(w, "wb")
+    errors = []
+
+    def upload():
+        try:
+            _s3_client().upload_fileobj(reader, bucket, key, Config=_transfer_config())
+        except Exception as e:
+            errors.append(e)
+        finally:
+            reader.close()
+
+    t = threading.Thread(target=upload, name=f"s3-upload-{key}", daemon=True)
+    t.start()
+    try:
+        yield writer
+    except BaseException as exc:
+        writer.close()
+        t.join()
+        _s3_client().delete_object(Bucket=bucket, Key=key)
+        if errors:
+            # a broken pipe in the writer is just the symptom of a failed upload
+            raise errors[0] from exc
+        raise
+    writer.close()
+    t.join()
+    if errors:
+        raise errors[0]
+
+def upload_to_s3(local_path: str, key: str, sha256: str | None = None) -> str:
+    """
+    Return presigned URL (5 days) or local path if no S3 env vars set.
+    Large files go up as parallel multipart uploads. When `sha256` is given it
+    is stored as object metadata, and an identical object already at `key`
+    is not uploaded again.
+    """
+    bucket = os.getenv("S3_BUCKET")
+    if not bucket:
+        return local_path
+    if sha256 and _remote_sha256(bucket, key) == sha256:
+        return _presign(bucket, key)
+    _s3_client().upload_file(
+        local_path, bucket, key,
+        Config=_transfer_config(),
+        ExtraArgs={"Metadata": {"sha256": sha256}} if sha256 else None,
     )
+    return _presign(bucket, key)
 
-def process_df(df: pd.DataFrame, outfile_stub: str = "clean.csv") -> tuple[str, str]:
+def process_df(df: pd.DataFrame, outfile_stub: str = "clean.csv", fmt: str = "csv",
+               stats: dict | None = None, **parquet_opts) -> tuple[str, str]:
+    """
+    Clean, save, checksum and upload. fmt="parquet" writes zstd-compressed,
+    dictionary-encoded Parquet instead of CSV; `parquet_opts` override
+    PARQUET_DEFAULTS (compression, compression_level, row_group_size, use_dictionary).
+    Pass a dict as `stats` to get bytes, rows, md5 and sha256 of the written file.
+    """
+    stats = {} if stats is None else stats
     df = _basic_preprocess(df)
-    local, md5 = save_and_checksum(df, outfile_stub)
-    url = upload_to_s3(local, outfile_stub)
+    if fmt == "parquet":
+        outfile_stub = _with_ext(outfile_stub, ".parquet")
+        local, md5 = save_parquet_and_checksum([df], outfile_stub, stats, **parquet_opts)
+    else:
+        local, md5 = save_and_checksum(df, outfile_stub, stats)
+    url = upload_to_s3(local, outfile_stub, stats["sha256"])
+    return url, md5
+
+def _stream_key(outfile_stub: str, stream: bool) -> str | None:
+    return outfile_stub if stream and os.getenv("S3_BUCKET") else None
+
+def process_chunks(chunks: Iterable[pd.DataFrame], outfile_stub: str = "clean.csv",
+                   fmt: str = "csv", stats: dict | None = None, stream: bool = False,
+                   engine: CleaningEngine | None = None, **parquet_opts) -> tuple[str, str]:
+    """
+    Streaming counterpart of process_df for iter_query_chunks / iter_table_chunks.
+    One CleaningEngine cleans every chunk, so dtypes (and dedupe keys) carry
+    across chunks. With stream=True (and S3 configured) the output goes straight
+    to S3 as a multipart upload with no temp file; the content-hash skip doesn't
+    apply there since the hash is only known once the upload has finished.
+    """
+    stats = {} if stats is None else stats
+    engine = engine or CleaningEngine()
+    if fmt == "parquet":
+        outfile_stub = _with_ext(outfile_stub, ".parquet")
+    s3_key = _stream_key(outfile_stub, stream)
+    if fmt == "parquet":
+        cleaned = (engine.clean(c) for c in chunks)
+        local, md5 = save_parquet_and_checksum(cleaned, outfile_stub, stats, s3_key,
+                                               source_types=engine.source_types, **parquet_opts)
+    else:
+        local, md5 = save_chunks_and_checksum(chunks, outfile_stub, stats, s3_key, clean=engine.clean)
+    if s3_key:
+        return _presign(os.getenv("S3_BUCKET"), s3_key), md5
+    url = upload_to_s3(local, outfile_stub, stats["sha256"])
+    return url, md5
+
+def process_copy(copy_to, outfile_stub: str = "clean.csv", stats: dict | None = None,
+                 stream: bool = False) -> tuple[str, str]:
+    """COPY-export counterpart of process_df; cleaning already happened in SQL."""
+    stats = {} if stats is None else stats
+    s3_key = _stream_key(outfile_stub, stream)
+    local, md5 = save_copy_and_checksum(copy_to, outfile_stub, stats, s3_key)
+    if s3_key:
+        return _presign(os.getenv("S3_BUCKET"), s3_key), md5
+    url = upload_to_s3(local, outfile_stub, stats["sha256"])
     return url, md5
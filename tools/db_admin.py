@@ -1,8 +1,19 @@
 import os
+import re
+import json
+import shutil
+import time
+import atexit
+import threading
 import subprocess
 import hashlib
 import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import psycopg2
+from psycopg2 import sql as pgsql
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
@@ -10,8 +21,9 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Paths to the PostgreSQL CLI tools (set in your .env)
-PG_DUMP = os.getenv("PG_DUMP_PATH", "pg_dump")
-PSQL    = os.getenv("PSQL_PATH",   "psql")
+PG_DUMP    = os.getenv("PG_DUMP_PATH",    "pg_dump")
+PG_RESTORE = os.getenv("PG_RESTORE_PATH", "pg_restore")
+PSQL       = os.getenv("PSQL_PATH",       "psql")
 
 # Database connection parameters
 PG = dict(
@@ -22,86 +34,1039 @@ PG = dict(
     port=os.getenv("PG_PORT", 5432),
 )
 
+POOL_MAX            = int(os.getenv("STAGING_POOL_MAX", 4))
+AUDIT_BATCH_SIZE    = int(os.getenv("AUDIT_BATCH_SIZE", 50))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", 2))
+SEED_LOAD_JOBS      = int(os.getenv("SEED_LOAD_JOBS", POOL_MAX))
+DIFF_CHUNK_ROWS     = int(os.getenv("DIFF_CHUNK_ROWS", 10_000))   # PK range width per hash bucket
+DIFF_HASH_BUCKETS   = int(os.getenv("DIFF_HASH_BUCKETS", 64))     # buckets for tables without an integer PK
+
+# Pre-seeded database cloned by reset_database(); CREATE/DROP DATABASE run
+# from the maintenance DB, since you can't drop the DB you're connected to
+TEMPLATE_DB    = os.getenv("STAGING_TEMPLATE_DB", f"{PG['dbname']}_template")
+MAINTENANCE_DB = os.getenv("PG_MAINTENANCE_DB", "postgres")
+
 # Directory where snapshots will be stored
 SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", "/tmp/db_snapshots"))
 SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
 
+# "directory" → pg_dump -Fd -j N (one compressed file per table, dumped in parallel)
+# "custom"    → pg_dump -Fc, a single compressed archive hashed as it streams
+SNAPSHOT_FORMAT   = os.getenv("SNAPSHOT_FORMAT", "directory")
+SNAPSHOT_JOBS     = int(os.getenv("SNAPSHOT_JOBS", os.cpu_count() or 1))
+SNAPSHOT_COMPRESS = os.getenv("SNAPSHOT_COMPRESS", "1")   # gzip level, or e.g. "zstd:3" on PG16+ builds with zstd
+MANIFEST_NAME     = "manifest.json"
+HASH_BLOCK        = 1 << 20
+
+# Snapshot store: identical files (e.g. an unchanged table's data) are
+# hard-linked to one copy under objects/, and old snapshots are pruned
+OBJECTS_DIR            = SNAPSHOT_DIR / "objects"
+SNAPSHOT_KEEP          = int(os.getenv("SNAPSHOT_KEEP", 10))
+SNAPSHOT_MAX_GB        = float(os.getenv("SNAPSHOT_MAX_GB", 20))
+SNAPSHOT_MAX_AGE_DAYS  = float(os.getenv("SNAPSHOT_MAX_AGE_DAYS", 14))
+
 # Path to your seed SQL script
 SEED_SQL = os.getenv("SEED_SQL_PATH")
+# Byte-offset index of the seed's per-table segments (see build_seed_index)
+SEED_INDEX = Path(os.getenv("SEED_INDEX_PATH", str(SNAPSHOT_DIR / "seed_index.json")))
+
+_pool: ThreadedConnectionPool | None = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_MAX)   # wait for a free connection instead of raising
 
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ThreadedConnectionPool(1, POOL_MAX, **PG, options="-c search_path=public")
+                pool.minconn = POOL_MAX   # keep returned connections instead of closing all but one
+                _pool = pool
+    return _pool
+
+def close_pool():
+    """Close every pooled staging connection, e.g. before the DB is dropped and recreated."""
+    global _pool, _migrated
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+    _migrated = False
+
+def _healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+@contextmanager
 def _conn():
-    return psycopg2.connect(**PG, options="-c search_path=public")
-
-def snapshot_db() -> tuple[str, str]:
-    """
-    Run pg_dump to snapshot the entire database.
-    Returns (path_to_dump_file, sha256_checksum).
-    """
-    ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    outfile = SNAPSHOT_DIR / f"{PG['dbname']}_{ts}.sql"
-    cmd = [
-        PG_DUMP,
-        "-h", PG["host"],
-        "-U", PG["user"],
-        "-p", str(PG["port"]),
-        PG["dbname"],
-        "-f", str(outfile),
-    ]
-    # pg_dump reads PGPASSWORD from env
-    subprocess.check_call(cmd, env={**os.environ, "PGPASSWORD": PG["password"]})
-    sha = hashlib.sha256(outfile.read_bytes()).hexdigest()
-    return str(outfile), sha
+    """
+    Borrow a pooled staging connection; commits on success, rolls back on
+    error. Connections killed by a reset are discarded and replaced.
+    """
+    pool = _get_pool()
+    _slots.acquire()
+    try:
+        conn = pool.getconn()
+        if not _healthy(conn):
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except Exception:
+        _slots.release()
+        raise
+
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+        except PoolError:
+            # close_pool() ran while we held it (e.g. a reset on another thread)
+            conn.close()
+        finally:
+            _slots.release()
+
+def _cli_args() -> list[str]:
+    """Connection flags shared by pg_dump / pg_restore / psql (unset values are left to libpq defaults)."""
+    args = []
+    for flag, key in (("-h", "host"), ("-U", "user"), ("-p", "port")):
+        if PG[key]:
+            args += [flag, str(PG[key])]
+    return args
+
+def _cli_env() -> dict:
+    # pg_dump/pg_restore/psql read PGPASSWORD from env
+    return {**os.environ, "PGPASSWORD": PG["password"]} if PG["password"] else dict(os.environ)
+
+def _sha256_file(path: Path) -> tuple[str, int]:
+    h, size = hashlib.sha256(), 0
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK):
+            h.update(block)
+            size += len(block)
+    return h.hexdigest(), size
+
+def _manifest_sha(files: dict) -> str:
+    """One checksum for the whole snapshot: sha256 over the sorted per-file hashes."""
+    listing = "\n".join(f"{name} {meta['sha256']}" for name, meta in sorted(files.items()))
+    return hashlib.sha256(listing.encode()).hexdigest()
+
+def _snapshot_args(snapshot_id: str | None) -> list[str]:
+    return ["--snapshot", snapshot_id] if snapshot_id else []
+
+def _dump_directory(target: Path, jobs: int, snapshot_id: str | None = None) -> dict:
+    try:
+        subprocess.check_call(
+            [PG_DUMP, *_cli_args(), "-Fd", "-j", str(jobs), "-Z", SNAPSHOT_COMPRESS, *_snapshot_args(snapshot_id),
+             "-f", str(target), PG["dbname"]],
+            env=_cli_env(),
+        )
+    except subprocess.CalledProcessError:
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+    paths = sorted(p for p in target.iterdir() if p.is_file())
+    # hashlib releases the GIL, so the per-table files hash in parallel too
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        hashes = pool.map(_sha256_file, paths)
+    return {p.name: {"sha256": sha, "bytes": size} for p, (sha, size) in zip(paths, hashes)}
+
+def _dump_custom(target: Path, snapshot_id: str | None = None) -> dict:
+    """pg_dump -Fc to stdout, hashed on the way to disk — the archive is never re-read."""
+    h, size = hashlib.sha256(), 0
+    proc = subprocess.Popen(
+        [PG_DUMP, *_cli_args(), "-Fc", "-Z", SNAPSHOT_COMPRESS, *_snapshot_args(snapshot_id), PG["dbname"]],
+        stdout=subprocess.PIPE, env=_cli_env(),
+    )
+    with open(target, "wb") as out:
+        while block := proc.stdout.read(HASH_BLOCK):
+            h.update(block)
+            out.write(block)
+            size += len(block)
+    if proc.wait():
+        target.unlink(missing_ok=True)
+        raise subprocess.CalledProcessError(proc.returncode, PG_DUMP)
+    return {target.name: {"sha256": h.hexdigest(), "bytes": size}}
+
+def _manifest_path(snapshot: Path) -> Path:
+    return snapshot / MANIFEST_NAME if snapshot.is_dir() else snapshot.with_name(snapshot.name + ".manifest.json")
+
+# Per-table write counters plus each table's relfilenode (TRUNCATE, VACUUM
+# FULL and CLUSTER swap it) and catalog xmin (any DDL). Reading these is
+# instant, unlike checksumming rows. pg_stat counters reach the shared view
+# when the writing backend goes idle or at least once a minute, so only
+# writes that are seconds old can be missed.
+CHANGE_FINGERPRINT_SQL = """
+SELECT md5(coalesce(string_agg(
+           concat_ws(':', c.oid, c.relfilenode, c.xmin, s.n_tup_ins, s.n_tup_upd, s.n_tup_del, s.n_live_tup),
+           ',' ORDER BY c.oid), ''))
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE c.relkind IN ('r', 'p', 'S', 'v', 'm') AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+"""
+
+def change_fingerprint() -> str:
+    """Cheap fingerprint of the DB's tables and their write counters (see snapshot_db's reuse)."""
+    with _conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_stat_clear_snapshot()")
+        cur.execute(CHANGE_FINGERPRINT_SQL)
+        return cur.fetchone()[0]
+
+def list_snapshots() -> list[tuple[Path, dict]]:
+    """[(snapshot path, manifest)] for every snapshot in SNAPSHOT_DIR, oldest first."""
+    found = []
+    for mf in [*SNAPSHOT_DIR.glob(f"*/{MANIFEST_NAME}"), *SNAPSHOT_DIR.glob("*.manifest.json")]:
+        try:
+            manifest = json.loads(mf.read_text())
+        except (OSError, ValueError):
+            continue
+        path = mf.parent if mf.name == MANIFEST_NAME else mf.with_name(mf.name.removesuffix(".manifest.json"))
+        if path.exists():
+            found.append((path, manifest))
+    return sorted(found, key=lambda x: (x[1]["created"], x[0].name))
+
+def _dedupe(target: Path, files: dict):
+    """
+    Swap each snapshot file for a hard link to the object store copy with the
+    same sha256, so unchanged tables cost no extra disk across snapshots.
+    """
+    base = target if target.is_dir() else target.parent
+    OBJECTS_DIR.mkdir(exist_ok=True)
+    for name, meta in files.items():
+        obj, path = OBJECTS_DIR / meta["sha256"], base / name
+        try:
+            if obj.exists():
+                tmp = path.with_name(path.name + ".link")
+                os.link(obj, tmp)
+                os.replace(tmp, path)
+            else:
+                os.link(path, obj)
+        except OSError:
+            return                  # e.g. a filesystem without hard links: keep full copies
+
+def _remove_snapshot(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+        _manifest_path(path).unlink(missing_ok=True)
+
+def prune_snapshots(keep: int = SNAPSHOT_KEEP, max_gb: float = SNAPSHOT_MAX_GB,
+                    max_age_days: float = SNAPSHOT_MAX_AGE_DAYS) -> list[str]:
+    """
+    Apply retention, oldest first: at most `keep` snapshots, none older than
+    `max_age_days`, and at most `max_gb` of distinct file content. The newest
+    snapshot is always kept. Objects no snapshot links to any more are deleted.
+    Returns the removed snapshot paths.
+    """
+    snapshots = list_snapshots()
+    now = datetime.datetime.utcnow()
+    removed = []
+
+    def unique_bytes(snaps):
+        return sum({m["sha256"]: m["bytes"] for _, mf in snaps for m in mf["files"].values()}.values())
+
+    while len(snapshots) > 1:
+        path, manifest = snapshots[0]
+        age = now - datetime.datetime.strptime(manifest["created"], "%Y%m%d_%H%M%S")
+        if (len(snapshots) > keep or age.total_seconds() > max_age_days * 86400
+                or unique_bytes(snapshots) > max_gb * 1024 ** 3):
+            _remove_snapshot(path)
+            removed.append(str(path))
+            snapshots.pop(0)
+        else:
+            break
+
+    if OBJECTS_DIR.exists():
+        for obj in OBJECTS_DIR.iterdir():
+            if obj.stat().st_nlink == 1:    # only the store's own link is left
+                obj.unlink()
+    return removed
+
+@contextmanager
+def _exported_snapshot():
+    """
+    Hold a read-only REPEATABLE READ transaction open on staging and yield
+    its exported snapshot id, so pg_dump (--snapshot) and db_profile read
+    exactly the same data.
+    """
+    conn = psycopg2.connect(**PG)
+    try:
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_export_snapshot()")
+            yield cur.fetchone()[0]
+    finally:
+        conn.close()
+
+def _row_hashes(profile: dict | None) -> dict | None:
+    return profile and {t: p["hash"] for t, p in profile.items()}
+
+def snapshot_db(fmt: str = SNAPSHOT_FORMAT, jobs: int = SNAPSHOT_JOBS,
+                reuse: bool = False, profile: bool = False) -> tuple[str, str]:
+    """
+    Snapshot the entire database with pg_dump, in directory format with
+    `jobs` parallel workers (or as a single custom-format archive).
+    Every output file is SHA-256'd in fixed-size blocks and recorded in a
+    manifest alongside the snapshot.
+    With profile=True the per-table row profile (db_profile, as used by
+    diff_live) is computed from the same exported snapshot pg_dump reads and
+    stored in the manifest. reuse=True implies it: an existing snapshot is
+    returned instead of dumping again only if every table's row hash matches
+    its stored profile *and* the change fingerprint (which also covers DDL
+    and TRUNCATE) is unchanged, so a write the stats counters haven't caught
+    up with can't make it reuse a stale backup. New snapshots are
+    deduplicated against earlier ones, then retention is applied.
+    Returns (path_to_snapshot, sha256 of the manifest's file hashes).
+    """
+    profile = profile or reuse
+    fingerprint = change_fingerprint()
+    with _exported_snapshot() as snapshot_id:
+        rows = None
+        if profile:
+            try:
+                rows = db_profile(snapshot_id=snapshot_id)
+            except psycopg2.Error as e:
+                print(f"Snapshot profile skipped: {e}")
+        if reuse and rows is not None:
+            for path, manifest in reversed(list_snapshots()):
+                if (manifest["database"] == PG["dbname"] and manifest.get("fingerprint") == fingerprint
+                        and manifest.get("profile_version") == PROFILE_VERSION
+                        and _row_hashes(manifest.get("profile")) == _row_hashes(rows)):
+                    print(f"Database unchanged since {path.name}; reusing that snapshot")
+                    return str(path), manifest["sha256"]
+
+        ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        start = time.perf_counter()
+        ext = ".dump" if fmt == "custom" else ""
+        target, n = SNAPSHOT_DIR / f"{PG['dbname']}_{ts}{ext}", 1
+        while target.exists():              # two snapshots within one second
+            target, n = SNAPSHOT_DIR / f"{PG['dbname']}_{ts}_{n}{ext}", n + 1
+        files = _dump_custom(target, snapshot_id) if fmt == "custom" else _dump_directory(target, jobs, snapshot_id)
+
+    sha = _manifest_sha(files)
+    manifest = {
+        "database":    PG["dbname"],
+        "created":     ts,
+        "format":      fmt,
+        "jobs":        jobs if fmt != "custom" else 1,
+        "seconds":     round(time.perf_counter() - start, 2),
+        "bytes":       sum(m["bytes"] for m in files.values()),
+        "sha256":      sha,
+        "fingerprint": fingerprint,
+        "files":       files,
+        "profile":     rows,
+        "profile_version": PROFILE_VERSION,
+    }
+    _dedupe(target, files)
+    _manifest_path(target).write_text(json.dumps(manifest, indent=2))
+    prune_snapshots()
+    return str(target), sha
+
+def verify_snapshot(path: str) -> bool:
+    """Re-hash a snapshot's files and compare them with its manifest."""
+    snapshot = Path(path)
+    manifest = json.loads(_manifest_path(snapshot).read_text())
+    base = snapshot if snapshot.is_dir() else snapshot.parent
+    for name, meta in manifest["files"].items():
+        if _sha256_file(base / name)[0] != meta["sha256"]:
+            return False
+    return True
+
+def restore_snapshot(path: str, jobs: int = SNAPSHOT_JOBS, verify: bool = True):
+    """
+    Restore a snapshot_db() snapshot with pg_restore, `jobs` tables at a time.
+    Existing objects are dropped first (--clean --if-exists).
+    """
+    if verify and not verify_snapshot(path):
+        raise ValueError(f"Snapshot {path} does not match its manifest")
+    global _migrated
+    subprocess.check_call(
+        [PG_RESTORE, *_cli_args(), "-d", PG["dbname"], "-j", str(jobs),
+         "--clean", "--if-exists", "--no-owner", path],
+        env=_cli_env(),
+    )
+    _migrated = False
 
 def wipe_db():
     """Drop and recreate the public schema (everything inside it)."""
+    global _migrated
     sql = "DROP SCHEMA public CASCADE; CREATE SCHEMA public;"
     with _conn() as conn, conn.cursor() as cur:
         cur.execute(sql)
-        conn.commit()
+    _migrated = False
 
-def restore_seed():
+def restore_seed(dbname: str | None = None, logger=print) -> dict:
     """
-    Restore the database by running your seed SQL file via psql.
+    Restore the database from your seed SQL file with the in-process loader
+    (parallel COPY, deferred indexes; see load_seed).
     """
-    cmd = [
-        PSQL,
-        "-h", PG["host"],
-        "-U", PG["user"],
-        "-p", str(PG["port"]),
-        "-d", PG["dbname"],
-        "-f", SEED_SQL,
-    ]
-    subprocess.check_call(cmd, env={**os.environ, "PGPASSWORD": PG["password"]})
+    global _migrated
+    report = load_seed(dbname, logger=logger)
+    _migrated = False
+    return report
+
+# ── template-database fast reset ────────────────────────────────────────────
+def _admin_conn():
+    conn = psycopg2.connect(**{**PG, "dbname": MAINTENANCE_DB})
+    conn.autocommit = True          # CREATE/DROP DATABASE can't run in a transaction
+    return conn
+
+def _terminate(cur, name: str):
+    cur.execute("SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()", (name,))
+
+def _drop_database(cur, name: str):
+    if cur.connection.server_version >= 130000:
+        # FORCE terminates sessions and drops in one step, so a client that
+        # reconnects in between can't make the drop fail
+        cur.execute(pgsql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(pgsql.Identifier(name)))
+    else:
+        _terminate(cur, name)
+        cur.execute(pgsql.SQL("DROP DATABASE IF EXISTS {}").format(pgsql.Identifier(name)))
 
-def log_audit(action: str, sha: str, approved_by: str):
+def _rename_database(cur, old: str, new: str):
+    _terminate(cur, old)
+    cur.execute(pgsql.SQL("ALTER DATABASE {} RENAME TO {}").format(pgsql.Identifier(old), pgsql.Identifier(new)))
+
+def _template_seed_sha(cur) -> str | None:
+    cur.execute("SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = %s", (TEMPLATE_DB,))
+    row = cur.fetchone()
+    return row[0].removeprefix("seed:") if row and row[0] else None
+
+def ensure_template(logger=print) -> bool:
     """
-    Record the refresh action in the audit_refresh table.
+    Make sure TEMPLATE_DB holds the current seed, rebuilding it if the seed's
+    sha256 (recorded as the database comment) changed. The new template is
+    seeded under a scratch name and only swapped in once complete.
+    Returns True if it had to be rebuilt.
     """
-    with _conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS audit_refresh (
-            id serial PRIMARY KEY,
-            action text,
-            checksum text,
-            approved_by text,
-            ts timestamptz DEFAULT now()
-        )""")
-        cur.execute("""
-        INSERT INTO audit_refresh(action, checksum, approved_by)
-        VALUES (%s, %s, %s)
-        """, (action, sha, approved_by))
-        conn.commit()
+    sha = _seed_index()["sha256"]
+    conn = _admin_conn()
+    try:
+        with conn.cursor() as cur:
+            if _template_seed_sha(cur) == sha:
+                return False
+            building = f"{TEMPLATE_DB}_building"
+            _drop_database(cur, building)
+            cur.execute(pgsql.SQL("CREATE DATABASE {}").format(pgsql.Identifier(building)))
+            try:
+                restore_seed(building, logger=logger)
+                cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (TEMPLATE_DB,))
+                if cur.fetchone():
+                    # templates can't be dropped; the owner may clear the flag
+                    # (unlike updating pg_database, which needs superuser)
+                    cur.execute(pgsql.SQL("ALTER DATABASE {} IS_TEMPLATE false").format(
+                        pgsql.Identifier(TEMPLATE_DB)))
+                _drop_database(cur, TEMPLATE_DB)
+                cur.execute(pgsql.SQL("ALTER DATABASE {} RENAME TO {}").format(
+                    pgsql.Identifier(building), pgsql.Identifier(TEMPLATE_DB)))
+            except Exception:
+                _drop_database(cur, building)
+                raise
+            # no connections allowed → it can always be cloned
+            cur.execute(pgsql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE true ALLOW_CONNECTIONS false").format(
+                pgsql.Identifier(TEMPLATE_DB)))
+            cur.execute(pgsql.SQL("COMMENT ON DATABASE {} IS {}").format(
+                pgsql.Identifier(TEMPLATE_DB), pgsql.Literal(f"seed:{sha}")))
+            return True
+    finally:
+        conn.close()
+
+def fast_reset():
+    """
+    Recreate the staging DB as a file-level copy of TEMPLATE_DB
+    (CREATE DATABASE ... TEMPLATE). The copy is made under a scratch name
+    and swapped in by renames; the old staging DB is only dropped once the
+    swap succeeded, and a failed swap puts it back, so the seed-replay
+    fallback always finds a staging DB to load into.
+    """
+    staging, fresh, old = PG["dbname"], f"{PG['dbname']}_fresh", f"{PG['dbname']}_old"
+    close_pool()
+    conn = _admin_conn()
+    try:
+        with conn.cursor() as cur:
+            _drop_database(cur, fresh)
+            _drop_database(cur, old)
+            cur.execute(pgsql.SQL("CREATE DATABASE {} TEMPLATE {}").format(
+                pgsql.Identifier(fresh), pgsql.Identifier(TEMPLATE_DB)))
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (staging,))
+            existed = cur.fetchone() is not None
+            try:
+                if existed:
+                    _rename_database(cur, staging, old)
+                try:
+                    _rename_database(cur, fresh, staging)
+                except psycopg2.Error:
+                    if existed:
+                        _rename_database(cur, old, staging)
+                    raise
+            except psycopg2.Error:
+                _drop_database(cur, fresh)
+                raise
+            _drop_database(cur, old)
+    finally:
+        conn.close()
+
+def reset_database(fast: bool = True, logger=print) -> dict:
+    """
+    Reset staging to the seed. Tries the template clone first and falls back
+    to wipe_db() + restore_seed() if that fails (e.g. no CREATEDB rights).
+    Returns {"method": "template" | "seed_replay", "seconds", "template_rebuilt"}.
+    """
+    start = time.perf_counter()
+    if fast:
+        try:
+            rebuilt = ensure_template(logger)
+            fast_reset()
+            return {"method": "template", "seconds": round(time.perf_counter() - start, 3), "template_rebuilt": rebuilt}
+        except (psycopg2.Error, RuntimeError) as e:
+            logger(f"Template reset failed, falling back to seed replay: {e}")
+    wipe_db()
+    restore_seed(logger=logger)
+    return {"method": "seed_replay", "seconds": round(time.perf_counter() - start, 3), "template_rebuilt": False}
+
+# ── schema migration & audit log ────────────────────────────────────────────
+MIGRATION_SQL = """
+CREATE TABLE IF NOT EXISTS audit_refresh (
+    id serial PRIMARY KEY,
+    action text,
+    checksum text,
+    approved_by text,
+    ts timestamptz DEFAULT now()
+);
+ALTER TABLE audit_refresh
+    ADD COLUMN IF NOT EXISTS method text,
+    ADD COLUMN IF NOT EXISTS seconds numeric;
+"""
+_migrated = False
+_migrate_lock = threading.Lock()
+
+def migrate(force: bool = False):
+    """
+    Create/upgrade db_admin's own tables, once per process. wipe_db, resets,
+    restores and drop_table clear the flag, since they can take the tables with them.
+    """
+    global _migrated
+    with _migrate_lock:
+        if _migrated and not force:
+            return
+        with _conn() as conn, conn.cursor() as cur:
+            cur.execute(MIGRATION_SQL)
+        _migrated = True
+
+class AuditWriter:
+    """
+    Buffers audit rows and writes each batch with a single execute_values
+    INSERT on a pooled connection: every AUDIT_FLUSH_SECONDS, as soon as
+    AUDIT_BATCH_SIZE rows are waiting, on flush(), and at exit.
+    """
+
+    def __init__(self, batch_size: int = AUDIT_BATCH_SIZE, flush_seconds: float = AUDIT_FLUSH_SECONDS):
+        self._rows = []
+        self._batch_size = batch_size
+        self._flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, row: tuple):
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self._batch_size
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return
+            try:
+                self._write(rows)
+            except psycopg2.errors.UndefinedTable:
+                # the table went away under us (e.g. a reset elsewhere): recreate and retry once
+                migrate(force=True)
+                self._write(rows)
+            except Exception:
+                with self._lock:
+                    self._rows[:0] = rows       # keep them for the next attempt
+                raise
+
+    def _write(self, rows):
+        migrate()
+        with _conn() as conn, conn.cursor() as cur:
+            execute_values(cur, """
+            INSERT INTO audit_refresh(action, checksum, approved_by, method, seconds, ts)
+            VALUES %s
+            """, rows)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Audit flush failed, will retry: {e}")
+
+_audit = AuditWriter()
+
+def flush_audit():
+    """Write any buffered audit rows now."""
+    _audit.flush()
+
+@atexit.register
+def _flush_audit_at_exit():
+    try:
+        _audit.flush()
+    except Exception as e:
+        print(f"❌ Audit rows lost at exit: {e}")
+
+def log_audit(action: str, sha: str, approved_by: str,
+              method: str | None = None, seconds: float | None = None, flush: bool = False):
+    """
+    Record the refresh action in the audit_refresh table, with how the
+    restore was done (template / seed_replay / seed_segment) and how long it took.
+    Rows are buffered and batch-written; pass flush=True to wait until it's stored.
+    """
+    _audit.add((action, sha, approved_by, method, seconds, datetime.datetime.now(datetime.timezone.utc)))
+    if flush:
+        _audit.flush()
 
 # Optional helpers if you want table-specific operations:
 def drop_table(table_name: str):
     """Drop a single table by name."""
+    global _migrated
     with _conn() as conn, conn.cursor() as cur:
-        cur.execute(f"DROP TABLE IF EXISTS public.{table_name} CASCADE;")
-        conn.commit()
+        cur.execute(pgsql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(
+            pgsql.Identifier("public", table_name.strip().removeprefix("public."))))
+    _migrated = False
+
+# ── per-table seed index ────────────────────────────────────────────────────
+# seed_data.sql is a plain pg_dump; every object starts with a header like
+#   -- Name: auth_group; Type: TABLE; Schema: public; Owner: harsha
+#   -- Data for Name: auth_group; Type: TABLE DATA; Schema: public; Owner: harsha
+# so the file can be cut into segments at those lines and each one credited
+# to the table it belongs to.
+_HEADER_RE   = re.compile(rb"^-- (?:Data for )?Name: (.+?); Type: (.+?); Schema: ")
+_IDENTITY_RE = re.compile(r"ALTER TABLE (?:ONLY )?public\.(\w+) ALTER COLUMN")
+_OWNED_BY_RE = re.compile(r"OWNED BY public\.(\w+)\.")
+_ON_TABLE_RE = re.compile(r"\bON (?:ONLY )?public\.(\w+)")
+_REFS_RE     = re.compile(r"REFERENCES public\.(\w+)\(")
+
+SEED_INDEX_VERSION = 2
+
+def _scan_seed(path: str) -> tuple[int, list[dict]]:
+    """
+    One pass over the seed: (end of the SET preamble, [{type, name, start, end}]).
+    TABLE DATA segments also get the offsets of their COPY statement and data rows.
+    """
+    segments, preamble_end, offset, in_copy = [], None, 0, False
+    with open(path, "rb") as f:
+        for line in f:
+            if in_copy:
+                if line == b"\\.\n":
+                    in_copy = False
+                    segments[-1]["data_end"] = offset
+            elif line.startswith(b"COPY ") and line.rstrip().endswith(b"FROM stdin;"):
+                in_copy = True
+                if segments:
+                    segments[-1].update(copy=offset, data_start=offset + len(line))
+            elif m := _HEADER_RE.match(line):
+                if segments:
+                    segments[-1]["end"] = offset
+                else:
+                    preamble_end = offset
+                segments.append({"name": m.group(1).decode(), "type": m.group(2).decode(), "start": offset})
+            offset += len(line)
+    if segments:
+        segments[-1]["end"] = offset
+    return preamble_end or offset, segments
+
+def _read_range(path: str, start: int, end: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start).decode()
+
+def build_seed_index(seed_path: str = SEED_SQL) -> dict:
+    """
+    Parse the seed once into per-table segments (CREATE, sequences, defaults,
+    COPY data, setval, constraints, indexes) stored as byte offsets.
+    A table's entry also lists FK constraints on *other* tables that point at
+    it, since DROP TABLE ... CASCADE removes those too.
+    """
+    preamble_end, segments = _scan_seed(seed_path)
+    tables = {seg["name"] for seg in segments if seg["type"] == "TABLE"}
+
+    # sequences → owning table: identity columns say so in the SEQUENCE
+    # segment itself, serial columns in a separate SEQUENCE OWNED BY segment
+    seq_owner = {}
+    for seg in segments:
+        if seg["type"] in ("SEQUENCE", "SEQUENCE OWNED BY"):
+            body = _read_range(seed_path, seg["start"], seg["end"])
+            m = _IDENTITY_RE.search(body) or _OWNED_BY_RE.search(body)
+            if m:
+                seq_owner[seg["name"]] = m.group(1)
+
+    index = {t: [] for t in tables}
+    for seg in segments:
+        kind, name = seg["type"], seg["name"]
+        span = [seg["start"], seg["end"]]
+        if kind in ("TABLE", "TABLE DATA"):
+            owner = name
+        elif kind.startswith("SEQUENCE"):
+            owner = seq_owner.get(name)
+        elif kind == "INDEX":
+            m = _ON_TABLE_RE.search(_read_range(seed_path, *span))
+            owner = m.group(1) if m else None
+        else:                               # DEFAULT, CONSTRAINT, FK CONSTRAINT, COMMENT … → "<table> <object>"
+            owner = name.split(" ", 1)[0]
+        seg["table"] = owner if owner in index else None
+        if owner in index:
+            index[owner].append(span)
+        if kind == "FK CONSTRAINT":
+            m = _REFS_RE.search(_read_range(seed_path, *span))
+            if m and m.group(1) in index and m.group(1) != owner:
+                index[m.group(1)].append(span)
+
+    # pg_dump already orders objects so dependencies come first; keep that order
+    return {"version": SEED_INDEX_VERSION, "preamble": [0, preamble_end],
+            "tables": {t: sorted(spans) for t, spans in index.items()}, "segments": segments}
+
+def _seed_index() -> dict:
+    """
+    Load the seed index, rebuilding it only when the seed's sha256 changes.
+    An unchanged size + mtime skips even the hashing.
+    """
+    st = os.stat(SEED_SQL)
+    cached = None
+    if SEED_INDEX.exists():
+        cached = json.loads(SEED_INDEX.read_text())
+        if cached.get("version") != SEED_INDEX_VERSION:
+            cached = None
+        elif cached["seed"] == os.path.abspath(SEED_SQL) and (cached["size"], cached["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            return cached
+
+    sha = _sha256_file(Path(SEED_SQL))[0]
+    if not cached or cached["sha256"] != sha or cached["seed"] != os.path.abspath(SEED_SQL):
+        cached = {"seed": os.path.abspath(SEED_SQL), "sha256": sha, **build_seed_index(SEED_SQL)}
+    cached.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+    tmp = SEED_INDEX.with_suffix(".tmp")
+    tmp.write_text(json.dumps(cached))
+    os.replace(tmp, SEED_INDEX)
+    return cached
+
+def seed_tables(table_names: list[str]) -> list[str]:
+    """
+    The names with any `public.` prefix dropped, after checking the seed can
+    restore every one of them (ValueError if not). Call it before dropping anything.
+    """
+    tables = [t.strip().removeprefix("public.") for t in table_names]
+    unknown = [t for t in tables if t not in _seed_index()["tables"]]
+    if unknown:
+        raise ValueError(f"Table(s) {unknown} not found in {SEED_SQL}")
+    return tables
 
 def restore_table_from_seed(table_name: str):
     """
-    Restore tables from the seed file; here we re-run the entire seed.
-    If seed_data.sql contains only the table of interest, it recreates that table.
+    Recreate one table from the seed: stream only that table's segments
+    (plus the seed's SET preamble) into psql, in a single transaction.
+    """
+    restore_tables_from_seed([table_name])
+
+def restore_tables_from_seed(table_names: list[str]):
+    """
+    Same as restore_table_from_seed for several tables at once. Their
+    segments are merged in dump order, so CREATEs precede data and FKs
+    between the reloaded tables, and shared FK segments are applied once.
+    """
+    index = _seed_index()
+    tables = seed_tables(table_names)
+    spans = sorted({tuple(span) for t in tables for span in index["tables"][t]})
+
+    cmd = [PSQL, *_cli_args(), "-d", PG["dbname"], "-q", "-1", "-v", "ON_ERROR_STOP=1"]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, env=_cli_env())
+    try:
+        with open(SEED_SQL, "rb") as seed:
+            for start, end in [index["preamble"], *spans]:
+                seed.seek(start)
+                remaining = end - start
+                while remaining and (block := seed.read(min(HASH_BLOCK, remaining))):
+                    proc.stdin.write(block)
+                    remaining -= len(block)
+    finally:
+        proc.stdin.close()
+    if proc.wait():
+        raise subprocess.CalledProcessError(proc.returncode, PSQL)
+
+# ── in-process seed loader ──────────────────────────────────────────────────
+# Schema first, then every table's COPY block in parallel on its own pooled
+# connection, then constraints/indexes (per table, in parallel) and finally
+# sequences, FKs and triggers — the same deferral pg_restore uses.
+DEFERRED = {"SEQUENCE SET", "CONSTRAINT", "INDEX", "FK CONSTRAINT", "TRIGGER", "RULE", "POLICY"}
+PER_TABLE_DEFERRED = {"CONSTRAINT", "INDEX"}
+_OWNER_RE = re.compile(r"^ALTER [A-Z ]+ \S+ OWNER TO \S+;$", re.M)
+
+class _RangeReader:
+    """File-like view of seed[start:end] for copy_expert, read in HASH_BLOCK pieces."""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._f = open(path, "rb")
+        self._f.seek(start)
+        self._left = end - start
+
+    def read(self, size: int = -1) -> bytes:
+        size = self._left if size is None or size < 0 else min(size, self._left, HASH_BLOCK)
+        block = self._f.read(size)
+        self._left -= len(block)
+        return block
+
+    def close(self):
+        self._f.close()
+
+@contextmanager
+def _load_conn(dbname: str):
+    """A pooled connection for staging, or a one-off one for another DB (e.g. the template being built)."""
+    if dbname == PG["dbname"]:
+        with _conn() as conn:
+            yield conn
+            with conn.cursor() as cur:
+                cur.execute("RESET ALL")    # the seed preamble SETs search_path etc.; don't leak them into the pool
+        return
+    conn = psycopg2.connect(**{**PG, "dbname": dbname})
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def load_seed(dbname: str | None = None, logger=print, jobs: int = SEED_LOAD_JOBS,
+              no_owner: bool = True) -> dict:
+    """
+    Load SEED_SQL into an empty database without psql, from the seed index:
+      1. schema objects, in dump order, in one transaction
+      2. each table's COPY data via copy_expert, `jobs` tables at a time
+      3. per-table constraints and indexes, in parallel; then setval, FKs, triggers
+    `ALTER ... OWNER TO` lines are skipped when no_owner (like pg_restore --no-owner).
+    Progress goes to `logger`. Returns {table: {"rows", "seconds"} or {"error"}};
+    raises RuntimeError naming the tables whose data failed to load.
+    """
+    dbname = dbname or PG["dbname"]
+    index = _seed_index()
+    segments = index["segments"]
+    preamble = _read_range(SEED_SQL, *index["preamble"])
+    start = time.perf_counter()
+
+    def sql_of(seg) -> str:
+        text = _read_range(SEED_SQL, seg["start"], seg["end"])
+        return _OWNER_RE.sub("", text) if no_owner else text
+
+    def run(segs):
+        with _load_conn(dbname) as conn, conn.cursor() as cur:
+            cur.execute(preamble)
+            for seg in segs:
+                cur.execute(sql_of(seg))
+
+    schema = [s for s in segments if s["type"] != "TABLE DATA" and s["type"] not in DEFERRED]
+    run(schema)
+    logger(f"🧱 Schema created ({len(schema)} objects)")
+
+    def copy_one(seg):
+        t0 = time.perf_counter()
+        reader = _RangeReader(SEED_SQL, seg["data_start"], seg["data_end"])
+        try:
+            with _load_conn(dbname) as conn, conn.cursor() as cur:
+                cur.execute(preamble)
+                copy_sql = _read_range(SEED_SQL, seg["copy"], seg["data_start"]).strip().rstrip(";")
+                cur.copy_expert(copy_sql, reader, size=HASH_BLOCK)
+                rows = cur.rowcount
+        finally:
+            reader.close()
+        return rows, time.perf_counter() - t0
+
+    data = [s for s in segments if s["type"] == "TABLE DATA" and "data_end" in s]
+    report = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {pool.submit(copy_one, seg): seg["name"] for seg in data}
+        for i, fut in enumerate(as_completed(futures), 1):
+            table = futures[fut]
+            try:
+                rows, secs = fut.result()
+                report[table] = {"rows": rows, "seconds": round(secs, 3)}
+                logger(f"📥 {table}: {rows:,} rows in {secs:.2f}s ({i}/{len(data)})")
+            except Exception as e:
+                report[table] = {"error": str(e)}
+                logger(f"❌ {table}: {e}")
+    failed = [t for t, r in report.items() if "error" in r]
+    if failed:
+        raise RuntimeError(f"Seed data failed to load for: {', '.join(failed)}")
+
+    per_table = {}
+    for seg in segments:
+        if seg["type"] in PER_TABLE_DEFERRED:
+            per_table.setdefault(seg["table"] or seg["name"], []).append(seg)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for fut in as_completed([pool.submit(run, segs) for segs in per_table.values()]):
+            fut.result()
+    rest = [s for s in segments if s["type"] in DEFERRED - PER_TABLE_DEFERRED]
+    run(rest)
+    logger(f"🔑 Built {sum(map(len, per_table.values()))} constraints/indexes and {len(rest)} sequences/FKs")
+    logger(f"✅ Seed loaded in {time.perf_counter() - start:.2f}s")
+    return report
+
+# ── row-level diff ──────────────────────────────────────────────────────────
+# A table's profile is computed in one GROUP BY: rows are bucketed by PK
+# range (or by PK/row hash when there's no integer PK) and each bucket keeps
+# its row count and the sum of its rows' 64-bit hashes. The table hash is an
+# md5 over the buckets, so equal tables are recognised from one value and
+# differing ones narrowed down to the PK ranges that changed — Merkle-style,
+# without pulling any rows out of Postgres.
+PROFILE_TABLES_SQL = """
+SELECT c.relname, a.attname, t.typname
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_index i ON i.indrelid = c.oid AND i.indisprimary AND i.indnkeyatts = 1
+LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = i.indkey[0]
+LEFT JOIN pg_type t ON t.oid = a.atttypid
+WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+  AND c.relname <> 'audit_refresh'    -- our own bookkeeping, never in the seed
+"""
+INTEGER_TYPES = {"int2", "int4", "int8"}
+PROFILE_VERSION = 2                 # bump when bucketing changes; older profiles aren't comparable
+
+def _profile_table(dbname: str, table: str, key: str | None, key_type: str | None,
+                   snapshot_id: str | None = None) -> dict:
+    tbl = pgsql.Identifier("public", table)
+    if key and key_type in INTEGER_TYPES:
+        bucket, chunk = pgsql.SQL("floor({}::numeric / {})::bigint").format(pgsql.Identifier(key), pgsql.Literal(DIFF_CHUNK_ROWS)), DIFF_CHUNK_ROWS
+    else:
+        on = pgsql.SQL("{}::text").format(pgsql.Identifier(key)) if key else pgsql.SQL("r::text")
+        bucket, chunk = pgsql.SQL("abs(hashtext({}) % {})").format(on, pgsql.Literal(DIFF_HASH_BUCKETS)), None
+    query = pgsql.SQL("""
+        SELECT {bucket} AS b, count(*), sum(hashtextextended(r::text, 0)::numeric)::text
+        FROM {tbl} AS r GROUP BY 1
+    """).format(bucket=bucket, tbl=tbl)
+    with _load_conn(dbname) as conn, conn.cursor() as cur:
+        _use_snapshot(cur, snapshot_id)
+        cur.execute(query)
+        buckets = {str(b): [n, h] for b, n, h in cur.fetchall()}
+    digest = hashlib.md5(json.dumps(sorted(buckets.items(), key=lambda x: int(x[0]))).encode()).hexdigest()
+    return {"rows": sum(n for n, _ in buckets.values()), "key": key, "chunk": chunk,
+            "hash": digest, "buckets": buckets}
+
+def _use_snapshot(cur, snapshot_id: str | None):
+    """Make this (fresh) transaction see an exported snapshot, e.g. the one pg_dump is reading."""
+    if snapshot_id:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+
+def db_profile(dbname: str | None = None, jobs: int = SEED_LOAD_JOBS, snapshot_id: str | None = None) -> dict:
+    """
+    {table: profile} for every public table, profiled `jobs` tables at a
+    time; all as of `snapshot_id` (from pg_export_snapshot) if given.
+    """
+    dbname = dbname or PG["dbname"]
+    with _load_conn(dbname) as conn, conn.cursor() as cur:
+        _use_snapshot(cur, snapshot_id)
+        cur.execute(PROFILE_TABLES_SQL)
+        tables = cur.fetchall()
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {pool.submit(_profile_table, dbname, *t, snapshot_id): t[0] for t in tables}
+        return {futures[f]: f.result() for f in as_completed(futures)}
+
+def seed_profile() -> dict:
+    """
+    Profile of the current seed, cached per seed sha256. Computed once on a
+    throwaway clone of the template database.
+    """
+    sha = _seed_index()["sha256"]
+    cache = SNAPSHOT_DIR / f"seed_profile_v{PROFILE_VERSION}_{sha}.json"
+    if cache.exists():
+        return json.loads(cache.read_text())
+    ensure_template()
+    scratch = f"{PG['dbname']}_diff"
+    conn = _admin_conn()
+    try:
+        with conn.cursor() as cur:
+            _drop_database(cur, scratch)
+            cur.execute(pgsql.SQL("CREATE DATABASE {} TEMPLATE {}").format(
+                pgsql.Identifier(scratch), pgsql.Identifier(TEMPLATE_DB)))
+        try:
+            profile = db_profile(scratch)
+        finally:
+            with conn.cursor() as cur:
+                _drop_database(cur, scratch)
+    finally:
+        conn.close()
+    for old in SNAPSHOT_DIR.glob("seed_profile_*.json"):
+        old.unlink()
+    cache.write_text(json.dumps(profile))
+    return profile
+
+def diff_profiles(reference: dict, live: dict) -> dict:
+    """
+    Compare two profiles table by table:
+      {table: {"status": same|changed|added|missing, "rows": [ref, live],
+               "ranges": [[lo, hi], ...] changed PK ranges, or bucket ids}}
+    """
+    out = {}
+    for table in sorted(set(reference) | set(live)):
+        ref, cur = reference.get(table), live.get(table)
+        if ref is None or cur is None:
+            out[table] = {"status": "added" if ref is None else "missing",
+                          "rows": [ref and ref["rows"], cur and cur["rows"]], "ranges": []}
+            continue
+        if ref["hash"] == cur["hash"]:
+            out[table] = {"status": "same", "rows": [ref["rows"], cur["rows"]], "ranges": []}
+            continue
+        buckets = sorted((b for b in set(ref["buckets"]) | set(cur["buckets"])
+                          if ref["buckets"].get(b) != cur["buckets"].get(b)), key=int)
+        chunk = ref["chunk"] if ref["chunk"] == cur["chunk"] else None
+        ranges = [[int(b) * chunk, (int(b) + 1) * chunk - 1] for b in buckets] if chunk else [int(b) for b in buckets]
+        out[table] = {"status": "changed", "rows": [ref["rows"], cur["rows"]], "ranges": ranges}
+    return out
+
+def diff_live(reference: str = "seed", snapshot: str | None = None) -> dict:
+    """
+    Diff the live staging DB against the seed (reference="seed") or the
+    profile stored with the newest snapshot (reference="snapshot").
+    With `snapshot` (a snapshot_db() path, e.g. one just taken) the live side
+    is that snapshot's stored profile, so rows aren't hashed a second time.
     """
-    restore_seed()
+    live = None
+    if snapshot:
+        manifest = json.loads(_manifest_path(Path(snapshot)).read_text())
+        if manifest.get("profile_version") == PROFILE_VERSION:
+            live = manifest.get("profile")
+    if reference == "snapshot":
+        snaps = [m for _, m in list_snapshots() if m["database"] == PG["dbname"]
+                 and m.get("profile") and m.get("profile_version") == PROFILE_VERSION]
+        if not snaps:
+            raise ValueError("No snapshot with a stored profile yet")
+        ref = snaps[-1]["profile"]
+    else:
+        ref = seed_profile()
+    return diff_profiles(ref, live or db_profile())
@@ -1,20 +1,145 @@
-import os, pandas as pd, psycopg2
+import os, threading, uuid, pandas as pd, psycopg2
+from typing import Iterator
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 load_dotenv()
 
-
-PG_CONN = psycopg2.connect(                        
+PG_DSN = dict(
     host=os.getenv("PG_HOST"),
     dbname=os.getenv("PG_DB"),
     user=os.getenv("PG_USER"),
     password=os.getenv("PG_PASSWORD"),
     port=os.getenv("PG_PORT", 5432),
+    connect_timeout=int(os.getenv("PG_CONNECT_TIMEOUT", 5)),
 )
-def fetch_table_as_df(table: str, where: str | None = None) -> pd.DataFrame:
+POOL_MIN = int(os.getenv("PG_POOL_MIN", 1))
+POOL_MAX = int(os.getenv("PG_POOL_MAX", 10))
+STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", 60_000))
+CHUNK_ROWS = int(os.getenv("PG_CHUNK_ROWS", 50_000))
+
+_pool: ThreadedConnectionPool | None = None
+_pool_lock = threading.Lock()
+# psycopg2's pool raises when exhausted; make callers wait for a free slot instead
+_slots = threading.BoundedSemaphore(POOL_MAX)
+
+def _get_pool() -> ThreadedConnectionPool:
+    """Create the pool on first use, so importing this module never needs a live DB."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ThreadedConnectionPool(POOL_MIN, POOL_MAX, **PG_DSN)
+                # psycopg2 closes any returned connection once `minconn` are
+                # idle, so with the default of 1 every concurrent borrow paid
+                # for a new connection. Open POOL_MIN up front but keep up to
+                # POOL_MAX once they exist.
+                pool.minconn = POOL_MAX
+                _pool = pool
+    return _pool
+
+def _healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+@contextmanager
+def get_conn(timeout_ms: int | None = None, read_only: bool = False):
+    """
+    Borrow a pooled connection for one unit of work.
+    Dead connections (e.g. after a dropped socket) are discarded and replaced;
+    `statement_timeout` is applied with SET LOCAL so it ends with the transaction,
+    and `read_only` makes the server refuse any write in it.
+    Commits on success, rolls back on error, and always returns the connection.
+    """
+    pool = _get_pool()
+    _slots.acquire()
+    try:
+        conn = pool.getconn()
+        if not _healthy(conn):
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except Exception:
+        _slots.release()
+        raise
+
+    broken = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL statement_timeout = %s", (timeout_ms or STATEMENT_TIMEOUT_MS,))
+            if read_only:
+                cur.execute("SET TRANSACTION READ ONLY")
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=broken or bool(conn.closed))
+        _slots.release()
+
+def table_query(table: str, where: str | None = None) -> str:
     qry = f"SELECT * FROM {table}"
     if where:
         qry += f" WHERE {where}"
-    return pd.read_sql(qry, PG_CONN)
+    return qry
+
+def iter_query_chunks(sql: str, params=None, chunk_size: int = CHUNK_ROWS,
+                      timeout_ms: int | None = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream a query as DataFrames of at most `chunk_size` rows.
+    Uses a named (server-side) cursor, so only one chunk is ever held in memory
+    no matter how large the result is. The pooled connection is held until
+    the generator is exhausted or closed. Runs in a READ ONLY transaction.
+    """
+    with get_conn(timeout_ms, read_only=True) as conn:
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+            cur.itersize = chunk_size
+            cur.execute(sql, params)
+            columns, yielded = None, False
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if columns is None:
+                    columns = [d[0] for d in cur.description]
+                if not rows:
+                    break
+                yielded = True
+                yield pd.DataFrame.from_records(rows, columns=columns)
+            if not yielded:
+                # still hand consumers the column names for an empty result
+                yield pd.DataFrame(columns=columns)
+
+def iter_table_chunks(table: str, where: str | None = None,
+                      chunk_size: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    return iter_query_chunks(table_query(table, where), chunk_size=chunk_size)
+
+def describe_query(sql: str) -> list[tuple[str, str]]:
+    """Return [(column name, postgres type name)] for a query without fetching rows."""
+    with get_conn(read_only=True) as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM ({sql}) AS q LIMIT 0")
+        cols = [(d.name, d.type_code) for d in cur.description]
+        cur.execute("SELECT oid, typname FROM pg_type WHERE oid = ANY(%s)",
+                    ([oid for _, oid in cols],))
+        names = dict(cur.fetchall())
+    return [(name, names.get(oid, "unknown")) for name, oid in cols]
+
+def copy_query_to(sql: str, fileobj, timeout_ms: int | None = None):
+    """Stream `COPY (sql) TO STDOUT WITH CSV HEADER` straight into a binary file object."""
+    with get_conn(timeout_ms, read_only=True) as conn, conn.cursor() as cur:
+        cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", fileobj)
+
+def fetch_table_as_df(table: str, where: str | None = None) -> pd.DataFrame:
+    with get_conn() as conn:
+        return pd.read_sql(table_query(table, where), conn)
 
 def get_table_catalog(limit: int = 200) -> str:
     """
@@ -29,4 +154,11 @@ def get_table_catalog(limit: int = 200) -> str:
     GROUP BY 1
     LIMIT %s;
     """
-    return pd.read_sql(sql, PG_CONN, params=[limit]).to_string(index=False)
+    with get_conn() as conn:
+        return pd.read_sql(sql, conn, params=[limit]).to_string(index=False)
+
+def explain_query(sql: str, timeout_ms: int | None = None) -> dict:
+    """Planner estimate for a query (EXPLAIN, not ANALYZE — nothing is executed): the root plan node."""
+    with get_conn(timeout_ms, read_only=True) as conn, conn.cursor() as cur:
+        cur.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        return cur.fetchone()[0][0]["Plan"]
@@ -1,5 +1,6 @@
-import os, base64, json, requests
+import os, time, base64, json, requests
 from functools import lru_cache
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,6 +8,11 @@ SITE   = os.getenv("JIRA_SITE")            # https://harshadayini.atlassian.net
 EMAIL  = os.getenv("JIRA_EMAIL")
 TOKEN  = os.getenv("JIRA_API_TOKEN")
 PROJECT = os.getenv("JIRA_PROJECT_KEY", "DO3")   # <-- update to your new key
+POOL_SIZE = int(os.getenv("JIRA_POOL_SIZE", 4))
+TIMEOUT   = float(os.getenv("JIRA_TIMEOUT", 30))
+DONE_STATUS = os.getenv("JIRA_DONE_STATUS", "Done")
+BULK_MAX = 50                                    # Jira's limit per /issue/bulk call
+BULK_WAIT_SECONDS = float(os.getenv("JIRA_BULK_WAIT_SECONDS", 30))
 
 auth = base64.b64encode(f"{EMAIL}:{TOKEN}".encode()).decode()
 HEAD = {
@@ -15,51 +21,162 @@ HEAD = {
     "Content-Type":  "application/json",
 }
 
+# One keep-alive session for every call, so a workflow pays for the TLS
+# handshake once instead of once per request.
+session = requests.Session()
+session.headers.update(HEAD)
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+
+# (project, issue type) → id of the transition into DONE_STATUS. The
+# workflow is fixed per project and issue type, so after the first lookup
+# closing an issue needs no GET. JIRA_DONE_TRANSITION_ID skips even that.
+_done_transitions: dict[tuple[str, str], str] = {}
+if os.getenv("JIRA_DONE_TRANSITION_ID"):
+    _done_transitions[(PROJECT, "Task")] = os.getenv("JIRA_DONE_TRANSITION_ID")
+
+
+def _call(method: str, path: str, **kwargs) -> requests.Response:
+    return session.request(method, f"{SITE}{path}", timeout=TIMEOUT, **kwargs)
 
 
 @lru_cache
+def _components() -> dict[str, str]:
+    comps = _call("GET", f"/rest/api/3/project/{PROJECT}/components").json()
+    return {c["name"].lower(): c["id"] for c in comps}
+
 def component_id(name: str) -> str:
-    url = f"{SITE}/rest/api/3/project/{PROJECT}/components"
-    comps = requests.get(url, headers=HEAD).json()
-    for c in comps:
-        if c["name"].lower() == name.lower():
-            return c["id"]
-    raise ValueError(f"No component named {name} in project {PROJECT}")
+    try:
+        return _components()[name.lower()]
+    except KeyError:
+        raise ValueError(f"No component named {name} in project {PROJECT}") from None
+
+
+def _done_transition(issue: str, issuetype: str) -> str:
+    key = (PROJECT, issuetype)
+    if key not in _done_transitions:
+        trans = _call("GET", f"/rest/api/3/issue/{issue}/transitions").json()["transitions"]
+        _done_transitions[key] = next(t["id"] for t in trans if t["to"]["name"] == DONE_STATUS)
+    return _done_transitions[key]
+
+
+class JiraBulkError(RuntimeError):
+    """
+    Some tasks of a bulk call failed. `keys` lines up with the tasks passed
+    in (None where creation failed); `failures` maps task index → error.
+    """
+
+    def __init__(self, message: str, keys: list, failures: dict):
+        super().__init__(message)
+        self.keys = keys
+        self.failures = failures
+
+
+def create_tasks(tasks: list[tuple[str, str]], issuetype: str = "Task") -> tuple[list, dict]:
+    """
+    Create one task per (dept, summary), tagged with the dept component, via
+    /issue/bulk. Jira creates what it can even when some elements fail, so
+    this returns (keys lined up with `tasks`, None where creation failed,
+    {task index: error}) instead of throwing away the issues that exist.
+    """
+    keys, failures = [None] * len(tasks), {}
+    for i in range(0, len(tasks), BULK_MAX):
+        batch = tasks[i:i + BULK_MAX]
+        updates = [{
+            "fields": {
+                "project":    {"key": PROJECT},
+                "summary":    summary,
+                "issuetype":  {"name": issuetype},
+                "components": [{"id": component_id(dept)}],   # dept = IT / Security / HR / Facilities
+            }
+        } for dept, summary in batch]
+        r = _call("POST", "/rest/api/3/issue/bulk", json={"issueUpdates": updates})
+        data = r.json() if r.content else {}
+        if r.status_code >= 300 and not data.get("issues"):
+            # the whole batch was rejected
+            for n in range(len(batch)):
+                failures[i + n] = data or r.text
+            continue
+        failed = {}
+        for err in data.get("errors", []):
+            el = err.get("elementErrors", {})
+            failed[err["failedElementNumber"]] = "; ".join(
+                [*el.get("errorMessages", []), *(f"{k}: {v}" for k, v in el.get("errors", {}).items())]
+            ) or str(err)
+        # created issues come back in request order, minus the failed elements
+        created = iter(data.get("issues", []))
+        for n in range(len(batch)):
+            if n in failed:
+                failures[i + n] = failed[n]
+            else:
+                keys[i + n] = next(created)["key"]
+    if failures:
+        print("❌ Jira issue creation failed for:", {tasks[n][0]: e for n, e in failures.items()})
+    return keys, failures
+
+
+def _wait_bulk_task(task_id: str) -> dict:
+    """Poll a bulk operation until Jira reports it finished; returns the final task."""
+    deadline = time.monotonic() + BULK_WAIT_SECONDS
+    delay = 0.25
+    while True:
+        task = _call("GET", f"/rest/api/3/bulk/queue/{task_id}").json()
+        if task.get("status") not in ("ENQUEUED", "RUNNING"):
+            return task
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Jira bulk transition {task_id} still {task.get('status')} after {BULK_WAIT_SECONDS}s.")
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
+
+
+def close_issues(keys: list[str], issuetype: str = "Task"):
+    """
+    Move issues to DONE_STATUS: one bulk-transition call, waited on until
+    Jira has applied it, or per-issue transitions where that API isn't available.
+    """
+    if not keys:
+        return
+    done_id = _done_transition(keys[0], issuetype)
+    if len(keys) > 1:
+        r = _call("POST", "/rest/api/3/bulk/issues/transition", json={
+            "bulkTransitionInputs": [{"selectedIssueIdsOrKeys": keys, "transitionId": done_id}],
+            "sendBulkNotification": False,
+        })
+        if r.status_code < 300:
+            task = _wait_bulk_task(r.json()["taskId"])
+            failed = task.get("failedAccessibleIssues") or {}
+            if task.get("status") != "COMPLETE" or failed or task.get("invalidOrInaccessibleIssueCount"):
+                print("❌ Jira bulk transition failed:", task)
+                raise RuntimeError(f"Jira bulk transition {task.get('status', '?').lower()}"
+                                   + (f"; failed: {', '.join(failed)}" if failed else "") + ".")
+            return
+        if r.status_code not in (404, 405):
+            print("❌ Jira bulk transition failed:", r.text)
+            raise RuntimeError("Jira bulk transition failed.")
+    for issue in keys:
+        r = _call("POST", f"/rest/api/3/issue/{issue}/transitions",
+                  json={"transition": {"id": done_id}})
+        if r.status_code >= 300:
+            print(f"❌ Jira transition failed for {issue}:", r.text)
+            raise RuntimeError(f"Jira transition failed for {issue}.")
+
+
+def create_and_close_tasks(tasks: list[tuple[str, str]]) -> list[str]:
+    """
+    Create a batch of component-tagged tasks, then transition them all to Done.
+    If some couldn't be created, the ones that were are still closed and a
+    JiraBulkError names only the failed tasks (so a retry can skip the rest).
+    """
+    keys, failures = create_tasks(tasks)
+    close_issues([k for k in keys if k])
+    if failures:
+        done = ", ".join(f"{k} ({tasks[n][0]})" for n, k in enumerate(keys) if k)
+        failed = ", ".join(f"{tasks[n][0]}: {e}" for n, e in failures.items())
+        raise JiraBulkError(f"Jira task creation failed for {failed}"
+                            + (f" (created → Done: {done})" if done else ""), keys, failures)
+    return keys
 
 
 def create_and_close_task(dept: str, summary: str):
     """Create a task tagged with a component, then transition to Done."""
-    comp_id = component_id(dept)   # dept = IT / Security / HR / Facilities i made these components in slack
-    payload = {
-        "fields": {
-            "project":    {"key": PROJECT},
-            "summary":    summary,
-            "issuetype":  {"name": "Task"},
-            "components": [{"id": comp_id}]
-        }
-    }
-    response = requests.post(f"{SITE}/rest/api/3/issue", headers=HEAD, json=payload)
-    data = response.json()
-
-    # Debug print
-    if "key" not in data:
-        print("❌ Jira issue creation failed:", data)
-
-    r = requests.post(f"{SITE}/rest/api/3/issue", headers=HEAD, json=payload)
-
-    if r.status_code >= 300:
-        # Show the full error response before breaking
-        print("❌ Jira issue creation failed:", r.json())
-        raise RuntimeError("Jira issue creation failed.")
-
-    data = r.json()
-    
-    issue = data["key"]  # This will now only fail if something really breaks
-
-    # 2. move to Done
-    trans = requests.get(f"{SITE}/rest/api/3/issue/{issue}/transitions",
-                         headers=HEAD).json()["transitions"]
-    done_id = next(t["id"] for t in trans if t["to"]["name"] == "Done")
-    requests.post(f"{SITE}/rest/api/3/issue/{issue}/transitions",
-                  headers=HEAD, json={"transition": {"id": done_id}})
-    return issue
+    return create_and_close_tasks([(dept, summary)])[0]
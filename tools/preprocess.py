@@ -1,14 +1,40 @@
 import pandas as pd, streamlit as st
 from tools import db_tools, data_cleaner
+from tools.cleaning_engine import CleaningEngine
 
 def run_uploaded(file, logger):
     df = pd.read_csv(file)
     url, md5 = data_cleaner.process_df(df, "clean_upload.csv")
     logger(f"✅ Clean CSV ready → {url}\n\nMD5: `{md5}`")
 
-def run_db(table: str, where: str | None, logger):
+def run_db(table: str, where: str | None, logger, fast: bool = False):
+    fname = f"{table.replace('.','_')}_clean.csv"
+    if fast:
+        # COPY … TO STDOUT with the cleaning rules pushed into the SQL
+        src = db_tools.table_query(table, where)
+        clean_sql = data_cleaner.pushdown_clean_sql(src, db_tools.describe_query(src))
+        if clean_sql:
+            logger("⏳ Exporting from Postgres with COPY…")
+            url, md5 = data_cleaner.process_copy(
+                lambda f: db_tools.copy_query_to(clean_sql, f), fname
+            )
+            logger(f"✅ Clean CSV saved → {url}\n\nMD5: `{md5}`")
+            return
+        logger("ℹ️ Text *_date columns need pandas parsing; using the streaming path.")
+
     logger("⏳ Querying Postgres…")
-    df = db_tools.fetch_table_as_df(table, where)
-    logger(f"🔍 {len(df):,} rows fetched")
-    url, md5 = data_cleaner.process_df(df, f"{table.replace('.','_')}_clean.csv")
+    rows = 0
+    def counted(chunks):
+        nonlocal rows
+        for chunk in chunks:
+            rows += len(chunk)
+            yield chunk
+    # column types from the catalog keep every chunk on the same dtypes
+    src_types = dict(db_tools.describe_query(db_tools.table_query(table, where)))
+    url, md5 = data_cleaner.process_chunks(
+        counted(db_tools.iter_table_chunks(table, where)),
+        fname,
+        engine=CleaningEngine(source_types=src_types),
+    )
+    logger(f"🔍 {rows:,} rows fetched")
     logger(f"✅ Clean CSV saved → {url}\n\nMD5: `{md5}`")
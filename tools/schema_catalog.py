@@ -0,0 +1,235 @@
+import os, re, glob, json, math, time, tempfile, threading, pandas as pd
+from collections import Counter
+from tools.db_tools import get_conn
+
+CATALOG_DIR = os.getenv("CATALOG_DIR", os.path.join(tempfile.gettempdir(), "bella_catalog"))
+CATALOG_CHECK_SECONDS = int(os.getenv("CATALOG_CHECK_SECONDS", 60))
+CATALOG_TOP_K = int(os.getenv("CATALOG_TOP_K", 8))
+CATALOG_MAX_TABLES = int(os.getenv("CATALOG_MAX_TABLES", 20))
+CACHE_VERSION = 2                   # bump when the on-disk layout changes
+USER_SCHEMAS = "n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname NOT LIKE 'pg_toast%%'"
+
+# Any CREATE/ALTER/DROP/RENAME rewrites the affected pg_class/pg_attribute rows,
+# which gives them a new xmin — hashing those is far cheaper than reading the
+# whole of information_schema just to find out nothing changed.
+FINGERPRINT_SQL = f"""
+SELECT md5(coalesce(string_agg(c.oid::text || ':' || c.xmin::text || ':' || a.attnum || ':' || a.xmin::text,
+                               ',' ORDER BY c.oid, a.attnum), ''))
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f') AND {USER_SCHEMAS}
+"""
+
+COLUMNS_SQL = """
+SELECT table_schema||'.'||table_name AS tbl, column_name, data_type
+FROM information_schema.columns
+WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
+ORDER BY table_schema, table_name, ordinal_position
+"""
+
+FOREIGN_KEYS_SQL = f"""
+SELECT DISTINCT n.nspname||'.'||c.relname, fn.nspname||'.'||f.relname
+FROM pg_constraint k
+JOIN pg_class c      ON c.oid = k.conrelid
+JOIN pg_namespace n  ON n.oid = c.relnamespace
+JOIN pg_class f      ON f.oid = k.confrelid
+JOIN pg_namespace fn ON fn.oid = f.relnamespace
+WHERE k.contype = 'f' AND {USER_SCHEMAS}
+"""
+
+_lock = threading.Lock()
+# {"fingerprint": str, "tables": {tbl: [[col, type], ...]}, "fks": {tbl: [referenced/referencing tbl, ...]}}
+_catalog: dict | None = None
+_checked_at = 0.0
+_refreshing = False
+
+
+def schema_fingerprint() -> str:
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(FINGERPRINT_SQL)
+        return cur.fetchone()[0]
+
+def _fetch(fingerprint: str) -> dict:
+    tables: dict[str, list] = {}
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(COLUMNS_SQL)
+        for tbl, col, typ in cur:
+            tables.setdefault(tbl, []).append([col, typ])
+        cur.execute(FOREIGN_KEYS_SQL)
+        fks: dict[str, list] = {}
+        for child, parent in cur:
+            if child != parent:
+                fks.setdefault(child, []).append(parent)
+                fks.setdefault(parent, []).append(child)
+    return {"fingerprint": fingerprint, "tables": tables, "fks": fks}
+
+def _cache_path(fingerprint: str) -> str:
+    return os.path.join(CATALOG_DIR, f"catalog_v{CACHE_VERSION}_{fingerprint}.json")
+
+def _read_disk(path: str) -> dict | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_disk(catalog: dict):
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    path = _cache_path(catalog["fingerprint"])
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(catalog, f)
+    os.replace(tmp, path)
+    for old in glob.glob(os.path.join(CATALOG_DIR, "catalog_*.json")):
+        if old != path:
+            os.remove(old)
+
+def _load(fingerprint: str) -> dict:
+    """Disk cache for this fingerprint, else a fresh fetch (which is then cached)."""
+    cached = _read_disk(_cache_path(fingerprint))
+    if cached:
+        return cached
+    catalog = _fetch(fingerprint)
+    _write_disk(catalog)
+    return catalog
+
+def refresh(force: bool = False) -> dict:
+    """Check the fingerprint now and reload the catalog if the schema changed."""
+    global _catalog, _checked_at
+    fingerprint = schema_fingerprint()
+    if force or _catalog is None or _catalog["fingerprint"] != fingerprint:
+        catalog = _fetch(fingerprint) if force else _load(fingerprint)
+        if force:
+            _write_disk(catalog)
+        _catalog = catalog
+    _checked_at = time.monotonic()
+    return _catalog
+
+def _refresh_in_background():
+    global _refreshing
+    try:
+        refresh()
+    except Exception as e:
+        print(f"Schema catalog refresh failed: {e}")
+    finally:
+        _refreshing = False
+
+def get_catalog() -> dict:
+    """
+    Return the schema catalog, fetching it on first use.
+    Later calls return the in-memory copy immediately; once it is older than
+    CATALOG_CHECK_SECONDS a background thread re-checks the fingerprint and
+    swaps in a new catalog if the schema changed. If the DB is unreachable on
+    first use, the most recent on-disk catalog is used (and re-checked in the
+    background like any other) instead.
+    """
+    global _catalog, _checked_at, _refreshing
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                try:
+                    return refresh()
+                except Exception:
+                    files = sorted(glob.glob(os.path.join(CATALOG_DIR, f"catalog_v{CACHE_VERSION}_*.json")), key=os.path.getmtime)
+                    cached = _read_disk(files[-1]) if files else None
+                    if not cached:
+                        raise
+                    print("Schema catalog: DB unreachable, using last cached catalog")
+                    # keep it until the next check interval rather than
+                    # retrying the connection (under the lock) on every call
+                    _catalog, _checked_at = cached, time.monotonic()
+                    return cached
+    if time.monotonic() - _checked_at > CATALOG_CHECK_SECONDS and not _refreshing:
+        with _lock:
+            if not _refreshing:
+                _refreshing = True
+                threading.Thread(target=_refresh_in_background, daemon=True).start()
+    return _catalog
+
+def catalog_text(limit: int = 200, tables: list[str] | None = None) -> str:
+    """
+    Render the catalog as the CSV-style table/columns listing fed to the LLM
+    (same shape as db_tools.get_table_catalog).
+    """
+    catalog = get_catalog()["tables"]
+    names = tables if tables is not None else list(catalog)
+    rows = [(t, ", ".join(f"{c} {typ}" for c, typ in catalog[t])) for t in names[:limit] if t in catalog]
+    return pd.DataFrame(rows, columns=["tbl", "cols"]).to_string(index=False)
+
+
+# ── relevance pruning ────────────────────────────────────────────────────────
+# BM25 over character trigrams of table/column name words: trigrams make
+# "customers" match `manage_cust_customer` and "perms" match `permission_id`
+# without any stemming rules or network calls.
+STOPWORDS = {
+    "a", "all", "an", "and", "any", "by", "can", "for", "from", "get", "give", "i",
+    "in", "into", "is", "it", "list", "me", "my", "of", "on", "or", "please", "show",
+    "that", "the", "their", "them", "this", "to", "what", "which", "with", "you",
+}
+BM25_K1, BM25_B = 1.2, 0.75
+MIN_SCORE_RATIO = 0.4               # drop weak trigram matches relative to the best table
+
+_index: dict | None = None          # built once per catalog fingerprint
+
+def _words(text: str) -> list[str]:
+    return [w for w in re.split(r"[^a-z0-9]+", text.lower()) if w and w not in STOPWORDS]
+
+def _trigrams(words: list[str]) -> list[str]:
+    grams = []
+    for w in words:
+        w = f" {w} "
+        grams.extend(w[i:i + 3] for i in range(len(w) - 2))
+    return grams
+
+def _get_index(catalog: dict) -> dict:
+    global _index
+    if _index is None or _index["fingerprint"] != catalog["fingerprint"]:
+        docs = {}
+        for tbl, cols in catalog["tables"].items():
+            name = _words(tbl.split(".", 1)[-1])
+            # the table's own name counts double against its columns
+            docs[tbl] = Counter(_trigrams(name * 2 + [w for c, _ in cols for w in _words(c)]))
+        df = Counter(g for grams in docs.values() for g in grams)
+        n = len(docs) or 1
+        _index = {
+            "fingerprint": catalog["fingerprint"],
+            "docs": docs,
+            "lengths": {t: sum(g.values()) for t, g in docs.items()},
+            "avg_len": sum(sum(g.values()) for g in docs.values()) / n,
+            "idf": {g: math.log(1 + (n - f + 0.5) / (f + 0.5)) for g, f in df.items()},
+        }
+    return _index
+
+def rank_tables(request_text: str) -> list[tuple[str, float]]:
+    """All tables with a non-zero BM25 score against the request, best first."""
+    index = _get_index(get_catalog())
+    query = set(_trigrams(_words(request_text)))
+    scores = []
+    for tbl, grams in index["docs"].items():
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * index["lengths"][tbl] / (index["avg_len"] or 1))
+        score = sum(index["idf"][g] * grams[g] * (BM25_K1 + 1) / (grams[g] + norm)
+                    for g in query if g in grams)
+        if score > 0:
+            scores.append((tbl, score))
+    return sorted(scores, key=lambda x: -x[1])
+
+def relevant_tables(request_text: str, k: int = CATALOG_TOP_K,
+                    max_tables: int = CATALOG_MAX_TABLES) -> list[str] | None:
+    """
+    The top-k tables for a request (ignoring weak matches) followed by their
+    foreign-key neighbours, capped at max_tables. None when nothing matches, so callers can fall
+    back to the full catalog.
+    """
+    ranked = rank_tables(request_text)
+    if not ranked:
+        return None
+    best = ranked[0][1]
+    ranked = [t for t, score in ranked[:k] if score >= MIN_SCORE_RATIO * best]
+    fks = get_catalog().get("fks", {})
+    picked = list(ranked)
+    for tbl in ranked:
+        for other in fks.get(tbl, []):
+            if other not in picked:
+                picked.append(other)
+    return picked[:max_tables]
@@ -0,0 +1,84 @@
+import os, re, time, threading
+from collections import OrderedDict
+from tools import db_tools, schema_catalog
+
+MAX_EST_ROWS = int(os.getenv("SQL_MAX_EST_ROWS", 5_000_000))
+MAX_EST_COST = float(os.getenv("SQL_MAX_EST_COST", 10_000_000))
+SAMPLE_ROWS = int(os.getenv("SQL_SAMPLE_ROWS", 100_000))
+TIMEOUT_MS = int(os.getenv("SQL_TIMEOUT_MS", 30_000))
+CACHE_SIZE = int(os.getenv("SQL_GUARD_CACHE_SIZE", 256))
+CACHE_TTL_SECONDS = int(os.getenv("SQL_GUARD_CACHE_TTL", 600))   # table stats drift, so verdicts expire
+
+_cache: OrderedDict = OrderedDict()     # (sql, schema fingerprint) → (checked_at, verdict)
+_cache_lock = threading.Lock()
+
+# a semicolon only ends a statement outside string literals, quoted names and comments
+_LEXEME = re.compile(r"""\b[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|"(?:[^"]|"")*"|\$(\w*)\$.*?\$\1\$|--[^\n]*|/\*.*?\*/|;""", re.S)
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+
+
+def statements(sql: str) -> list[str]:
+    """Split SQL on its top-level semicolons, dropping empty (or comment-only) pieces."""
+    parts, start = [], 0
+    for m in _LEXEME.finditer(sql):
+        if m.group() == ";":
+            parts.append(sql[start:m.start()])
+            start = m.end()
+    parts.append(sql[start:])
+    return [p.strip() for p in parts if _COMMENT.sub("", p).strip()]
+
+def wrap(sql: str) -> str:
+    """
+    The form LLM SQL is always run in, so the result can be LIMITed and described.
+    This alone does not stop a second statement (`1) AS sub; DELETE ...` closes
+    the subquery early): check() rejects those first, and the queries run read-only.
+    """
+    return f"SELECT * FROM ({sql.strip().rstrip(';')}) AS sub"
+
+def _estimate(sql: str) -> tuple[float, float]:
+    node = db_tools.explain_query(sql, timeout_ms=TIMEOUT_MS)
+    return node["Plan Rows"], node["Total Cost"]
+
+def _verdict(sql: str) -> dict:
+    wrapped = wrap(sql)
+    rows, cost = _estimate(wrapped)
+    verdict = {"action": "run", "sql": wrapped, "est_rows": rows, "est_cost": cost, "reason": ""}
+    if rows > MAX_EST_ROWS:
+        # too many rows to export whole: see whether the first SAMPLE_ROWS are cheap to get
+        sampled = f"{wrapped} LIMIT {SAMPLE_ROWS}"
+        s_rows, s_cost = _estimate(sampled)
+        if s_cost <= MAX_EST_COST:
+            verdict.update(action="sample", sql=sampled, est_rows=s_rows, est_cost=s_cost,
+                           reason=f"~{rows:,.0f} rows estimated (limit {MAX_EST_ROWS:,}); sampling the first {SAMPLE_ROWS:,}")
+        else:
+            verdict.update(action="reject",
+                           reason=f"~{rows:,.0f} rows estimated and even a {SAMPLE_ROWS:,}-row sample costs {s_cost:,.0f} (limit {MAX_EST_COST:,.0f})")
+    elif cost > MAX_EST_COST:
+        verdict.update(action="reject", reason=f"estimated cost {cost:,.0f} exceeds limit {MAX_EST_COST:,.0f}")
+    return verdict
+
+def check(sql: str) -> dict:
+    """
+    Decide how (or whether) to run a generated query, from its EXPLAIN estimate:
+      run    → estimates within SQL_MAX_EST_ROWS / SQL_MAX_EST_COST
+      sample → too many rows, but a LIMIT SQL_SAMPLE_ROWS version is cheap
+      reject → too expensive either way (e.g. a huge sort or accidental cross join)
+    Returns {"action", "sql" (the statement to execute), "est_rows", "est_cost", "reason"}.
+    SQL with more than one statement is rejected before anything reaches the DB.
+    Verdicts are cached per schema fingerprint for SQL_GUARD_CACHE_TTL seconds.
+    """
+    if len(statements(sql)) > 1:
+        return {"action": "reject", "sql": "", "est_rows": 0, "est_cost": 0,
+                "reason": "only a single SELECT statement can be run", "cached": False}
+    key = (sql.strip().rstrip(";"), schema_catalog.get_catalog()["fingerprint"])
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and time.monotonic() - hit[0] < CACHE_TTL_SECONDS:
+            _cache.move_to_end(key)
+            return dict(hit[1], cached=True)
+    verdict = _verdict(key[0])
+    with _cache_lock:
+        _cache[key] = (time.monotonic(), verdict)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return dict(verdict, cached=False)
@@ -1,44 +1,319 @@
+import json
+import time
+import queue
+import threading
+from datetime import datetime, timedelta
+
 import streamlit as st
+from sqlalchemy import literal, update
+
+from db import SessionLocal, engine
+from models import RefreshJob
 from tools import db_admin
 
-def run(logger, table_name: str = None):
+# A refresh is a persisted job that moves through
+#   pending → snapshotted → approved → wiped → restored → audited
+# (or failed / cancelled). The heavy stages run on one background worker;
+# Streamlit only creates jobs, approves them and polls their status, so
+# reruns never repeat a snapshot or a restore.
+ACTIVE = ("pending", "approved", "wiped", "restored")
+WAITING = "snapshotted"
+POLL_SECONDS = 2
+HEARTBEAT_SECONDS = 10      # a worker running a stage touches updated_at this often
+STALE_SECONDS = 60          # …so a claim older than this belongs to a dead process
+
+_queue: queue.Queue = queue.Queue()
+_worker: threading.Thread | None = None
+_worker_lock = threading.Lock()
+
+
+def _update(job_id: int, status: str | None = None, log: str | None = None, timing: tuple | None = None, **fields):
+    db = SessionLocal()
+    try:
+        job = db.get(RefreshJob, job_id)
+        if status:
+            job.status = status
+        if log:
+            job.log = json.dumps(json.loads(job.log or "[]") + [log])
+        if timing:
+            job.timings = json.dumps({**json.loads(job.timings or "{}"), timing[0]: timing[1]})
+        for k, v in fields.items():
+            setattr(job, k, v)
+        job.updated_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+def _transition(job_id: int, from_status: str, **values) -> bool:
     """
-    DB refresh workflow.
-    If table_name is None, the entire DB schema is wiped and reseeded.
-    If table_name is provided, only that table is dropped and reseeded.
+    Atomic compare-and-set on (status, running): only an unclaimed job in
+    `from_status` matches. False if someone else got there first.
     """
-    # 1) Snapshot
-    snapshot_path, sha = db_admin.snapshot_db()
-    logger(f"✅ Snapshot saved → {snapshot_path}\nSHA256: `{sha}`")
+    db = SessionLocal()
+    try:
+        res = db.execute(
+            update(RefreshJob)
+              .where(RefreshJob.id == job_id, RefreshJob.status == from_status,
+                     RefreshJob.running.is_(None))
+              .values(updated_at=datetime.utcnow(), **values)
+        )
+        db.commit()
+        return res.rowcount == 1
+    finally:
+        db.close()
 
-    # 2) Approval
-    if table_name:
-        prompt = f"⚠️ APPROVE wiping & restoring table `{table_name}`"
-    else:
-        prompt = "⚠️ APPROVE wiping & restoring the entire database"
+def get_job(job_id: int) -> RefreshJob | None:
+    db = SessionLocal()
+    try:
+        return db.get(RefreshJob, job_id)
+    finally:
+        db.close()
 
-    if not st.button(prompt):
-        logger("Waiting for approval…")
-        return
+# ── stages: each returns (next status, extra fields, log line) ──────────────
+def _tables(job) -> list[str]:
+    return job.table_name.split(",") if job.table_name else []
 
-    # 3) Wipe
-    if table_name:
-        logger(f"🧨 Dropping table `{table_name}`…")
-        db_admin.drop_table(table_name)
-    else:
-        logger("🧨 Dropping and recreating public schema…")
-        db_admin.wipe_db()
+def changed_tables(job) -> list[str]:
+    """Tables the pre-refresh diff found different from the seed."""
+    diff = json.loads(job.diff or "{}")
+    return [t for t, d in diff.items() if d["status"] in ("changed", "missing")]
+
+def _summarise(diff: dict) -> str:
+    changed = [(t, d) for t, d in diff.items() if d["status"] != "same"]
+    if not changed:
+        return f"🔍 All {len(diff)} tables match the seed"
+    lines = [f"🔍 {len(changed)} of {len(diff)} tables differ from the seed:"]
+    for t, d in changed:
+        ref, live = d["rows"]
+        where = f", {len(d['ranges'])} PK range(s) e.g. {d['ranges'][0]}" if d["ranges"] else ""
+        lines.append(f"- `{t}` {d['status']} (rows {ref} → {live}{where})")
+    return "\n".join(lines)
+
+def _snapshot(job):
+    # a full refresh profiles every row for the diff anyway, which makes
+    # reusing an unchanged snapshot safe; a table refresh just dumps
+    full = not job.table_name
+    path, sha = db_admin.snapshot_db(reuse=full, profile=full)
+    fields, line = {"snapshot_path": path, "checksum": sha}, f"✅ Snapshot saved → {path}\nSHA256: `{sha}`"
+    if full:
+        # best effort: without a diff the operator can still approve a full refresh
+        try:
+            diff = db_admin.diff_live("seed", snapshot=path)
+            fields["diff"] = json.dumps(diff)
+            line += "\n" + _summarise(diff)
+        except Exception as e:
+            line += f"\n⚠️ Diff against the seed unavailable: {e}"
+    return "snapshotted", fields, line
+
+def _wipe(job):
+    if job.table_name:
+        # jobs are validated when queued; check again so nothing is dropped
+        # that the restore stage couldn't bring back
+        for table in db_admin.seed_tables(_tables(job)):
+            db_admin.drop_table(table)
+        return "wiped", {}, f"🧨 Dropped table(s) `{job.table_name}`"
+    # the template reset swaps in a fresh database in one step, so the
+    # whole-DB wipe happens inside the restore stage
+    return "wiped", {}, "🧨 Whole database will be replaced by the restore"
+
+def _restore(job):
+    if job.table_name:
+        db_admin.restore_tables_from_seed(_tables(job))
+        return "restored", {"method": "seed_segment"}, f"📥 Restored `{job.table_name}` from seed"
+    result = db_admin.reset_database(logger=lambda line: _update(job.id, log=line))
+    note = " (seed changed — template rebuilt first)" if result["template_rebuilt"] else ""
+    return "restored", {"method": result["method"]}, f"📥 Restored full database via {result['method']}{note}"
+
+def _audit(job):
+    timings = json.loads(job.timings or "{}")
+    action = f"refresh_table_{job.table_name}" if job.table_name else "refresh_full_database"
+    seconds = round(timings.get("wipe", 0) + timings.get("restore", 0), 3)
+    db_admin.log_audit(action=action, sha=job.checksum, approved_by=job.approved_by,
+                       method=job.method, seconds=seconds, flush=True)
+    return "audited", {}, f":tada: Refresh complete & audit logged ({job.method}, {seconds:.2f}s)."
+
+STAGES = {"pending": ("snapshot", _snapshot), "approved": ("wipe", _wipe),
+          "wiped": ("restore", _restore), "restored": ("audit", _audit)}
+
+def _advance(job_id: int):
+    """Run stages until the job needs approval or is finished."""
+    while True:
+        job = get_job(job_id)
+        if not job or job.status not in STAGES:
+            return
+        stage, fn = STAGES[job.status]
+        # claim the stage, so it can never run twice for one job
+        if not _transition(job_id, job.status, running=stage):
+            return
+        start = time.perf_counter()
+        done = threading.Event()
+        threading.Thread(target=_heartbeat, args=(job_id, stage, done), daemon=True).start()
+        try:
+            status, fields, line = fn(job)
+        except Exception as e:
+            _update(job_id, status="failed", running=None, error=str(e), log=f"❌ {stage} failed: {e}")
+            return
+        finally:
+            done.set()
+        _update(job_id, status=status, running=None, log=line,
+                timing=(stage, round(time.perf_counter() - start, 3)), **fields)
+
+def _heartbeat(job_id: int, stage: str, done: threading.Event):
+    """Keep our claim on the job visibly alive to other processes while the stage runs."""
+    while not done.wait(HEARTBEAT_SECONDS):
+        db = SessionLocal()
+        try:
+            db.execute(update(RefreshJob)
+                         .where(RefreshJob.id == job_id, RefreshJob.running == stage)
+                         .values(updated_at=datetime.utcnow()))
+            db.commit()
+        except Exception as e:
+            print(f"Refresh heartbeat failed for job {job_id}: {e}")
+        finally:
+            db.close()
 
-    # 4) Restore
+def _fail_stale():
+    """
+    Fail jobs whose claiming process stopped heart-beating: it died
+    mid-stage, and we don't guess whether the stage took effect. Claims
+    that are still fresh belong to a live process and are left alone.
+    """
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(RefreshJob)
+              .where(RefreshJob.status.in_(ACTIVE), RefreshJob.running.is_not(None),
+                     RefreshJob.updated_at < datetime.utcnow() - timedelta(seconds=STALE_SECONDS))
+              .values(status="failed", error=literal("interrupted during ") + RefreshJob.running,
+                      running=None, updated_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def _work():
+    while True:
+        job_id = _queue.get()
+        try:
+            _advance(job_id)
+        except Exception as e:
+            print(f"Refresh worker error on job {job_id}: {e}")
+        finally:
+            _queue.task_done()
+
+def _ensure_worker():
+    """Start the worker once per process, after settling jobs a previous process left behind."""
+    global _worker
+    with _worker_lock:
+        if _worker and _worker.is_alive():
+            return
+        RefreshJob.__table__.create(bind=engine, checkfirst=True)
+        try:
+            db_admin.migrate()
+        except Exception as e:
+            print(f"Staging migration deferred: {e}")
+        _fail_stale()
+        db = SessionLocal()
+        try:
+            # unclaimed jobs another process queued but never ran; if that
+            # process is still alive, the claim decides who runs each stage
+            for (job_id,) in db.query(RefreshJob.id).filter(RefreshJob.status.in_(ACTIVE),
+                                                           RefreshJob.running.is_(None)):
+                _queue.put(job_id)
+        finally:
+            db.close()
+        _worker = threading.Thread(target=_work, name="db-refresh-worker", daemon=True)
+        _worker.start()
+
+# ── API used by the UI ───────────────────────────────────────────────────────
+def start_refresh(table_name: str | None = None, requested_by: str = "streamlit_user") -> int:
+    """
+    Queue a refresh and return its job id. While a refresh of the same target
+    is still in flight (or awaiting approval) that job is returned instead.
+    Raises ValueError for a table the seed can't restore.
+    """
     if table_name:
-        logger(f"📥 Restoring `{table_name}` from seed…")
-        db_admin.restore_table_from_seed(table_name)
-        action = f"refresh_table_{table_name}"
-    else:
-        logger("📥 Restoring full database from seed…")
-        db_admin.restore_seed()
-        action = "refresh_full_database"
-
-    # 5) Audit
-    db_admin.log_audit(action=action, sha=sha, approved_by="streamlit_user")
-    logger(":tada: Refresh complete & audit logged.")
+        table_name = ",".join(db_admin.seed_tables(table_name.split(",")))
+    _ensure_worker()
+    db = SessionLocal()
+    try:
+        existing = (
+            db.query(RefreshJob)
+              .filter(RefreshJob.table_name.is_(table_name) if table_name is None else RefreshJob.table_name == table_name,
+                      RefreshJob.status.in_((*ACTIVE, WAITING)))
+              .order_by(RefreshJob.id.desc())
+              .first()
+        )
+        if existing:
+            return existing.id
+        job = RefreshJob(table_name=table_name, requested_by=requested_by, status="pending",
+                         timings="{}", log="[]")
+        db.add(job)
+        db.commit()
+        job_id = job.id
+    finally:
+        db.close()
+    _queue.put(job_id)
+    return job_id
+
+def approve(job_id: int, approved_by: str = "streamlit_user", tables: list[str] | None = None) -> bool:
+    """
+    Approve a snapshotted job. Only the first approval counts. `tables`
+    narrows a whole-database job down to reloading just those tables
+    (ValueError if the seed lacks any of them).
+    """
+    if tables:
+        tables = db_admin.seed_tables(tables)
+    _ensure_worker()
+    narrow = {"table_name": ",".join(tables)} if tables else {}
+    if not _transition(job_id, WAITING, status="approved", approved_by=approved_by, **narrow):
+        return False
+    scope = f" (only {', '.join(tables)})" if tables else ""
+    _update(job_id, log=f"👍 Approved by {approved_by}{scope}")
+    _queue.put(job_id)
+    return True
+
+def cancel(job_id: int) -> bool:
+    return _transition(job_id, WAITING, status="cancelled")
+
+def render(job_id: int, logger):
+    """
+    Show a job's progress. Only reads the job row (plus an approve/cancel
+    button while it waits), re-polling every POLL_SECONDS while work is running.
+    """
+    # after a restart the session may still point at an in-flight job:
+    # make sure a worker exists to pick it up, and settle dead claims
+    _ensure_worker()
+    _fail_stale()
+    job = get_job(job_id)
+    if not job:
+        logger(f"❌ Refresh job {job_id} not found")
+        return
+    for line in json.loads(job.log or "[]"):
+        logger(line)
+
+    if job.status == WAITING:
+        target = f"table `{job.table_name}`" if job.table_name else "the entire database"
+        changed = changed_tables(job)
+        diff = json.loads(job.diff or "{}")
+        added = [t for t, d in diff.items() if d["status"] == "added"]
+        if changed and not added and len(changed) < len(diff) and \
+                st.button(f"⚠️ APPROVE reloading only the {len(changed)} changed table(s)"):
+            approve(job_id, tables=changed)
+            st.experimental_rerun()
+        elif st.button(f"⚠️ APPROVE wiping & restoring {target}"):
+            approve(job_id)
+            st.experimental_rerun()
+        elif st.button("Cancel refresh"):
+            cancel(job_id)
+            st.experimental_rerun()
+        else:
+            logger("Waiting for approval…")
+    elif job.status in ACTIVE:
+        logger(f"⏳ {job.running or job.status}…")
+        time.sleep(POLL_SECONDS)
+        st.experimental_rerun()
+    elif job.status == "failed":
+        logger(f"❌ Refresh failed: {job.error}")
+    elif job.status == "cancelled":
+        logger("Refresh cancelled.")
@@ -1,26 +1,30 @@
+import os
+from dag import run_dag
 from tools import okta_bot, slack_bot, jira_bot
 
+MAX_WORKERS = int(os.getenv("WORKFLOW_MAX_WORKERS", 4))
 DEPARTMENTS = ["IT", "Security", "Facilities", "HR"]
 
 def run(email: str, log):
     """
     Off-boarding workflow, keyed only on email.
     log → callback (e.g. st.write) for streaming updates.
+
+    1) deactivate in Okta, then concurrently
+    2) announce the exit in Slack and 3) de-provision tasks in Jira.
     """
     log(":hourglass: Starting off-boarding…")
 
-    # 1) Deactivate in Okta
-    uid = okta_bot.deactivate_user(email)
-    log(f"✅ **Okta**: deactivated user `{uid}`")
-
-    # 2) Announce exit in Slack
-    ts = slack_bot.post_exit_message(email)
-    log(f"✅ **Slack**: exit message posted (ts={ts})")
-
-    # 3) De-provision tasks in Jira
-    for dept in DEPARTMENTS:
-        summary = f"{dept}: De-provision resources for {email}"
-        issue = jira_bot.create_and_close_task(dept, summary)
-        log(f"✅ **Jira** {issue} ({dept}) created → Done")
+    tasks = [(dept, f"{dept}: De-provision resources for {email}") for dept in DEPARTMENTS]
+    _, _, errors = run_dag({
+        "okta":  (lambda: okta_bot.deactivate_user(email), [],
+                  lambda uid: f"✅ **Okta**: deactivated user `{uid}`"),
+        "slack": (lambda uid: slack_bot.post_exit_message(email), ["okta"],
+                  lambda ts: f"✅ **Slack**: exit message posted (ts={ts})"),
+        "jira":  (lambda uid: jira_bot.create_and_close_tasks(tasks), ["okta"],
+                  lambda keys: "✅ **Jira** " + ", ".join(f"{k} ({d})" for k, (d, _) in zip(keys, tasks)) + " created → Done"),
+    }, max_workers=MAX_WORKERS, log=log)
 
+    if errors:
+        raise RuntimeError("Off-boarding failed at: " + ", ".join(f"{k} ({v})" for k, v in errors.items()))
     log(":tada: **Off-boarding complete!**")
@@ -1,20 +1,29 @@
+import os
+from dag import run_dag
 from tools import okta_bot, slack_bot, jira_bot
 
+MAX_WORKERS = int(os.getenv("WORKFLOW_MAX_WORKERS", 4))
+DEPARTMENTS = ["IT", "Security", "Facilities", "HR"]
+
 
 def run(first: str, last: str, email: str, st_write):
-    """One-shot onboarding pipeline; logs to Streamlit."""
+    """
+    One-shot onboarding pipeline; logs to Streamlit.
+    Okta goes first; the Slack welcome and the Jira tasks only need the
+    Okta user to exist, so they run side by side.
+    """
     st_write(":hourglass: Starting onboarding…")
 
-    uid = okta_bot.create_user(email, first, last)
-    st_write(f"✅ **Okta** user `{uid}` created")
-
-    ts = slack_bot.post_welcome_message(email)
-    st_write(f"✅ Slack: welcome message posted in #general (ts={ts})")
-    
-    for dept in ["IT", "Security", "Facilities", "HR"]:
-        issue = jira_bot.create_and_close_task(
-            dept, f"{dept}: Provision resources for {first} {last}"
-        )
-        st_write(f"✅ **Jira** {issue} ({dept}) created → Done")
+    tasks = [(dept, f"{dept}: Provision resources for {first} {last}") for dept in DEPARTMENTS]
+    _, _, errors = run_dag({
+        "okta":  (lambda: okta_bot.create_user(email, first, last), [],
+                  lambda uid: f"✅ **Okta** user `{uid}` created"),
+        "slack": (lambda uid: slack_bot.post_welcome_message(email), ["okta"],
+                  lambda ts: f"✅ Slack: welcome message posted in #general (ts={ts})"),
+        "jira":  (lambda uid: jira_bot.create_and_close_tasks(tasks), ["okta"],
+                  lambda keys: "✅ **Jira** " + ", ".join(f"{k} ({d})" for k, (d, _) in zip(keys, tasks)) + " created → Done"),
+    }, max_workers=MAX_WORKERS, log=st_write)
 
+    if errors:
+        raise RuntimeError("Onboarding failed at: " + ", ".join(f"{k} ({v})" for k, v in errors.items()))
     st_write(":tada: **Onboarding complete!**")
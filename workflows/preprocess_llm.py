@@ -5,7 +5,10 @@ import streamlit as st
 import re
 from pathlib import Path
 
-from tools import db_tools, data_cleaner
+from psycopg2.extensions import QueryCanceledError
+
+from tools import db_tools, data_cleaner, sql_guard
+from tools.cleaning_engine import CleaningEngine
 from planner import plan
 
 def log_df_overview(df: pd.DataFrame, logger):
@@ -16,10 +19,28 @@ def log_df_overview(df: pd.DataFrame, logger):
         nulls = df[col].isna().sum()
         logger(f"   • `{col}` — type: {dtype}, nulls: {nulls}")
 
+def tally_chunks(chunks, stats: dict):
+    """Pass chunks through unchanged while totting up rows, dtypes and nulls per column."""
+    for chunk in chunks:
+        stats["rows"] = stats.get("rows", 0) + len(chunk)
+        stats.setdefault("dtypes", chunk.dtypes.to_dict())
+        nulls = stats.setdefault("nulls", {})
+        for col, n in chunk.isna().sum().items():
+            nulls[col] = nulls.get(col, 0) + int(n)
+        yield chunk
+
+def log_stream_overview(stats: dict, logger):
+    """Same report as log_df_overview, built from tally_chunks stats."""
+    dtypes = stats.get("dtypes", {})
+    logger(f"ℹ️ Initial preview: {stats.get('rows', 0)} rows × {len(dtypes)} cols")
+    for col, dtype in dtypes.items():
+        logger(f"   • `{col}` — type: {dtype}, nulls: {stats['nulls'].get(col, 0)}")
+
 def run_nlp(request_text: str, logger):
     """
     Orchestrate the LLM-driven preprocess workflow.
-    The planner now uses a full table catalog, so no 'ask' loops are needed.
+    The planner sees the catalog tables relevant to the request (plus FK
+    neighbours), so no 'ask' loops are needed.
     """
     # 1) Plan the action
     decision = plan(request_text)
@@ -73,6 +94,20 @@ def run_nlp(request_text: str, logger):
     # show the SQL
     st.code(sql, language="sql")
 
+    # Cost guard: EXPLAIN first, so an accidental full scan never reaches the DB
+    try:
+        verdict = sql_guard.check(sql)
+    except Exception as e:
+        logger(f"❌ Could not plan the SQL: {e}")
+        return
+    logger(f"📐 Estimated ~{verdict['est_rows']:,.0f} rows, cost {verdict['est_cost']:,.0f}"
+           + (" (cached estimate)" if verdict["cached"] else ""))
+    if verdict["action"] == "reject":
+        logger(f"🛑 Not running this query: {verdict['reason']}. Please narrow the request.")
+        return
+    if verdict["action"] == "sample":
+        logger(f"⚠️ {verdict['reason']}")
+
     # Approval if dangerous
     if decision.get("dangerous", False):
         if not st.button("⚠️ Approve running this SQL"):
@@ -80,23 +115,31 @@ def run_nlp(request_text: str, logger):
             return
 
     logger("⏳ Executing query …")
-    df = db_tools.fetch_table_as_df(f"({sql}) AS sub")
-    logger(f"🔍 Fetched {df.shape[0]:,} rows × {df.shape[1]} cols")
+    # ——— Stream, clean & write chunk by chunk (memory stays bounded) ———
+    stats = {}
+    # column types from the query keep every chunk on the same dtypes, even
+    # when NULLs turn a later chunk's integers into floats
+    src_types = dict(db_tools.describe_query(verdict["sql"]))
+    chunks = tally_chunks(db_tools.iter_query_chunks(verdict["sql"], timeout_ms=sql_guard.TIMEOUT_MS), stats)
+    try:
+        url, md5 = data_cleaner.process_chunks(chunks, "clean_from_query.csv",
+                                               engine=CleaningEngine(source_types=src_types))
+    except QueryCanceledError:
+        logger(f"⏱️ Query cancelled after {sql_guard.TIMEOUT_MS / 1000:.0f}s (SQL_TIMEOUT_MS). Please narrow the request.")
+        return
+    logger(f"🔍 Fetched {stats.get('rows', 0):,} rows × {len(stats.get('dtypes', {}))} cols")
 
-    # ——— Log overview & planned cleaning steps —————————————————
-    log_df_overview(df, logger)
+    # ——— Log overview & applied cleaning steps —————————————————
+    log_stream_overview(stats, logger)
     logger("🔄 Cleaning steps:")
     logger("   1) Drop all rows containing any null values")
     logger("   2) Standardize column names to lowercase and trim whitespace")
-    date_cols = [c for c in df.columns if c.endswith("_date")]
+    date_cols = [c for c in stats.get("dtypes", {}) if c.lower().strip().endswith("_date")]
     if date_cols:
         logger(f"   3) Convert to datetime: {', '.join(date_cols)}")
     else:
         logger("   3) No *_date columns detected")
 
-    # ——— Run cleaning ————————————————————————————
-    url, md5 = data_cleaner.process_df(df, "clean_from_query.csv")
-
     # ——— Download button —————————————————————————
     file_path = Path(url)
     if file_path.exists():